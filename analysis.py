@@ -0,0 +1,19 @@
+import memo
+from purity import PurityAnalyzer
+
+
+def analyze(engine):
+    """
+    Parses the program of an engine and runs the passes every engine shares over it,
+    returning the resolved tree for the engine to lower or compile.
+
+    The engine's symantic_analyzer, optimizer and resolver run the passes, so the
+    symbols and imports they find stay available on the engine.
+    """
+    tree = engine.parser.parse()
+    engine.symantic_analyzer.visit(tree)
+    tree = engine.optimizer.optimize(tree)
+    engine.resolver.resolve(tree)
+    if memo.enabled:
+        PurityAnalyzer(engine.symantic_analyzer.symtab).analyze(tree)
+    return tree
@@ -1,5 +1,5 @@
 class AST(object):
-    pass
+    line = None  # the line a statement starts on, set by the Parser
 
 
 class Arg(AST):
@@ -48,11 +48,13 @@ class Code(AST):
     def __init__(self, token):
         self.token = token
         self.value = token.literal
+        self.code = None  # the compiled Python code, set by the Resolver
 
 
 class Compound(AST):
     def __init__(self):
         self.children = []
+        self.frame_size = 0  # number of local slots, set by the Resolver
 
 
 class ForStmt(AST):
@@ -68,6 +70,7 @@ class FuncCall(AST):
         self.name = name
         self.args = args  # a list of Arg nodes
         self.return_val = None
+        self.depth = self.slot = None  # lexical address, set by the Resolver
 
 
 class FuncDecl(AST):
@@ -75,6 +78,12 @@ class FuncDecl(AST):
         self.name = name
         self.params = params  # a list of Param nodes
         self.block_node = block_node
+        self.filename = None  # the file declaring the function, set by the Parser
+        self.slot = None
+        self.frame_size = 0  # number of local slots, set by the Resolver
+        self.encloses_functions = False
+        self.tail_calls = False  # set by the Resolver
+        self.pure = False  # set by the PurityAnalyzer
 
 
 class FuncLen(AST):
@@ -119,11 +128,13 @@ class Param(AST):
 class PrintStmt(AST):
     def __init__(self, args):
         self.args = args
+        self.template = None  # the PrintTemplate of the line printed, set by the Resolver
 
 
 class ReturnStmt(AST):
     def __init__(self, expr):
         self.expr = expr
+        self.tail_call = False  # set by the Resolver when expr is a call
 
 
 class String(AST):
@@ -143,6 +154,7 @@ class Var(AST):
         self.token = token
         self.value = token.lexeme
         self.index = index
+        self.depth = self.slot = None  # lexical address, set by the Resolver
 
 
 class VarDecl(AST):
@@ -156,3 +168,127 @@ class WhileStmt(AST):
     def __init__(self, cond, block):
         self.cond = cond
         self.block = block
+
+
+# Operator-specific nodes produced by the Lowering pass. Each one keeps the fields of
+# the node it replaces, so passes that don't know about it can treat it as the original.
+class Add(BinOp):
+    pass
+
+
+class Subtract(BinOp):
+    pass
+
+
+class Multiply(BinOp):
+    pass
+
+
+class Divide(BinOp):
+    pass
+
+
+class Modulo(BinOp):
+    pass
+
+
+class And(Logical):
+    pass
+
+
+class Or(Logical):
+    pass
+
+
+class Equal(Logical):
+    pass
+
+
+class NotEqual(Logical):
+    pass
+
+
+class Greater(Logical):
+    pass
+
+
+class GreaterEqual(Logical):
+    pass
+
+
+class Less(Logical):
+    pass
+
+
+class LessEqual(Logical):
+    pass
+
+
+class Negate(UnaryOp):
+    pass
+
+
+class Positive(UnaryOp):
+    pass
+
+
+class LocalVar(Var):
+    pass
+
+
+class GlobalVar(Var):
+    pass
+
+
+class SimpleAssign(Assign):
+    pass
+
+
+class AddAssign(Assign):
+    pass
+
+
+class SubtractAssign(Assign):
+    pass
+
+
+class MultiplyAssign(Assign):
+    pass
+
+
+class DivideAssign(Assign):
+    pass
+
+
+class IndexedAssign(Assign):
+    pass
+
+
+class IndexedAddAssign(Assign):
+    pass
+
+
+class IndexedSubtractAssign(Assign):
+    pass
+
+
+class IndexedMultiplyAssign(Assign):
+    pass
+
+
+class IndexedDivideAssign(Assign):
+    pass
+
+
+class LocalAssign(Assign):
+    pass
+
+
+class LocalIncrement(Assign):
+    def __init__(self, left, op, right, index, amount):
+        super().__init__(left, op, right, index)
+        self.amount = amount
+
+
+class TailCallReturn(ReturnStmt):
+    pass
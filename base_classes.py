@@ -1,8 +1,18 @@
 class NodeVisitor(object):
     def visit(self, node):
         method_name = 'visit_' + type(node).__name__
-        visitor = getattr(self, method_name, self.generic_visit)
+        visitor = getattr(self, method_name, None)
+        if visitor is None:
+            visitor = self.find_visitor(type(node))
         return visitor(node)
 
+    def find_visitor(self, node_type):
+        # Fall back to the visitor of a base node class, e.g. visit_BinOp for Add.
+        for cls in node_type.__mro__[1:]:
+            visitor = getattr(self, 'visit_' + cls.__name__, None)
+            if visitor is not None:
+                return visitor
+        return self.generic_visit
+
     def generic_visit(self, node):
-        raise Exception('No visit_{} method'.format(type(node).__name__))
\ No newline at end of file
+        raise Exception('No visit_{} method'.format(type(node).__name__))
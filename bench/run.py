@@ -0,0 +1,207 @@
+"""
+Times the workloads in bench/workloads, phase by phase.
+
+    python bench/run.py [workload ...] [--engine ENGINE] [-O LEVEL] [--repeat N] [--limits]
+                        [--native] [--output FILE] [--baseline FILE] [--threshold FRACTION]
+
+Every workload is run --repeat times after one warm-up run. Each run scans, parses,
+analyzes (including loading imported files and compiling, for the vm and closure
+engines) and executes the workload from scratch, with the parse cache off and no
+imported file loaded yet. The median time of each phase is reported along with the
+number of runs of the phase per second.
+
+--limits runs the workloads under every limit of the governor, set too high to be
+reached, to measure what enforcing them costs.
+
+lib/math and lib/arrays are imported from their .coiz sources, so the workloads
+using them time the engine rather than Python. --native imports their native
+versions instead.
+
+--output writes the results as JSON. --baseline compares them with results written
+earlier, and exits with status 1 if a phase got slower by more than --threshold.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+from time import perf_counter
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+WORKLOAD_DIR = os.path.join(ROOT_DIR, 'bench', 'workloads')
+sys.path.insert(0, ROOT_DIR)
+
+import cache
+import modules
+from governor import GOVERNED_ENGINES, Limits
+from runtime import ENGINES
+from scanner import Scanner
+from token_parser import Parser
+
+PHASES = ('scan', 'parse', 'analyze', 'execute', 'total')
+
+# Limits no workload reaches, for --limits.
+UNREACHED_LIMITS = Limits(steps=10 ** 12, time=3600, depth=10 ** 6, heap=10 ** 12)
+
+# Phases faster than this in the baseline are too noisy to fail a comparison.
+MIN_COMPARED_TIME = 0.001
+
+
+def workload_names():
+    return sorted(os.path.splitext(name)[0] for name in os.listdir(WORKLOAD_DIR) if name.endswith('.coiz'))
+
+
+def run_once(name, source, engine, optimize, limits=None, native=False):
+    """Runs a workload once, returning the time taken by each phase."""
+    # Start from a fresh registry so imported files are loaded on every run.
+    modules.registry = modules.ModuleRegistry(native=native)
+    times = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = perf_counter()
+        scanner = Scanner(source, name)
+        scanner.scan_tokens()
+        times['scan'] = perf_counter() - start
+        if scanner.has_error:
+            raise SyntaxError(f"Workload {name} has scanning errors.")
+
+        start = perf_counter()
+        parser = Parser(scanner)
+        parser.parse()
+        times['parse'] = perf_counter() - start
+        if parser.has_error:
+            raise SyntaxError(f"Workload {name} has parsing errors.")
+
+        start = perf_counter()
+        if limits:
+            interpreter = GOVERNED_ENGINES[engine](parser, limits, optimize)
+        else:
+            interpreter = ENGINES[engine](parser, optimize)
+        program = interpreter.prepare()
+        times['analyze'] = perf_counter() - start
+
+        start = perf_counter()
+        interpreter.execute(program)
+        times['execute'] = perf_counter() - start
+    times['total'] = sum(times.values())
+    return times
+
+
+def run_workload(name, engine, optimize, repeat, limits=None, native=False):
+    with open(os.path.join(WORKLOAD_DIR, name + '.coiz'), 'r') as f:
+        source = f.read()
+
+    run_once(name, source, engine, optimize, limits, native)
+    runs = [run_once(name, source, engine, optimize, limits, native) for _ in range(repeat)]
+
+    results = {}
+    for phase in PHASES:
+        times = [run[phase] for run in runs]
+        median = statistics.median(times)
+        results[phase] = {
+            'median': median,
+            'ops_per_sec': 1 / median if median else None,
+            'times': times,
+        }
+    return results
+
+
+def print_results(results, file=sys.stdout):
+    print('%-12s %-8s %14s %14s' % ('workload', 'phase', 'median (ms)', 'ops/s'), file=file)
+    for name, phases in results.items():
+        for phase, result in phases.items():
+            ops = '%14.1f' % result['ops_per_sec'] if result['ops_per_sec'] else '%14s' % '-'
+            print('%-12s %-8s %14.3f %s' % (name, phase, 1000 * result['median'], ops), file=file)
+
+
+def compare(results, baseline, threshold, file=sys.stdout):
+    """Prints the change of every median from the baseline, returning the regressed phases."""
+    regressions = []
+    print('%-12s %-8s %14s %14s %8s' % ('workload', 'phase', 'baseline (ms)', 'now (ms)', 'change'), file=file)
+    for name, phases in results.items():
+        base_phases = baseline['workloads'].get(name)
+        if base_phases is None:
+            continue
+        for phase, result in phases.items():
+            base = base_phases.get(phase)
+            if base is None or not base['median']:
+                continue
+            change = result['median'] / base['median'] - 1
+            regressed = change > threshold and base['median'] >= MIN_COMPARED_TIME
+            if regressed:
+                regressions.append((name, phase))
+            print('%-12s %-8s %14.3f %14.3f %+7.1f%%%s' % (name, phase, 1000 * base['median'],
+                                                         1000 * result['median'], 100 * change,
+                                                         '  SLOWER' if regressed else ''), file=file)
+    return regressions
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog='bench/run.py', description='Coizscript benchmarks.')
+    arg_parser.add_argument('workloads', nargs='*', metavar='workload',
+                            help=f'workloads to run (default: all of {", ".join(workload_names())})')
+    arg_parser.add_argument('--engine', choices=ENGINES.keys(), default='tree',
+                            help='execution engine (default: tree)')
+    arg_parser.add_argument('-O', dest='optimize', type=int, choices=(0, 1, 2), default=0,
+                            help='optimization level (default: 0)')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='timed runs per workload (default: 5)')
+    arg_parser.add_argument('--limits', action='store_true',
+                            help='run under limits too high to be reached, to measure the cost of enforcing them')
+    arg_parser.add_argument('--native', action='store_true',
+                            help='import the native versions of lib/math and lib/arrays')
+    arg_parser.add_argument('--output', metavar='FILE', help='write the results to FILE as JSON')
+    arg_parser.add_argument('--baseline', metavar='FILE', help='compare the results with those in FILE')
+    arg_parser.add_argument('--threshold', type=float, default=0.1,
+                            help='fraction a median may grow by before it counts as a regression '
+                                 '(default: 0.1)')
+    args = arg_parser.parse_args(argv)
+
+    names = args.workloads or workload_names()
+    for name in names:
+        if name not in workload_names():
+            arg_parser.error(f'unknown workload {name!r}')
+    if args.limits and args.engine not in GOVERNED_ENGINES:
+        arg_parser.error(f'the {args.engine} engine cannot enforce limits')
+    limits = UNREACHED_LIMITS if args.limits else None
+
+    # Imports in the workloads are relative to the root of the repository.
+    os.chdir(ROOT_DIR)
+    cache.enabled = False
+
+    results = {name: run_workload(name, args.engine, args.optimize, args.repeat, limits, args.native)
+               for name in names}
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'engine': args.engine,
+                'optimize': args.optimize,
+                'repeat': args.repeat,
+                'limits': args.limits,
+                'native': args.native,
+                'python': platform.python_version(),
+                'workloads': results,
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if (baseline['engine'], baseline['optimize']) != (args.engine, args.optimize):
+            print(f"Warning: the baseline was run with --engine {baseline['engine']} -O{baseline['optimize']}.",
+                  file=sys.stderr)
+        if baseline.get('native', False) != args.native:
+            print(f"Warning: the baseline was run {'with' if baseline.get('native') else 'without'} --native.",
+                  file=sys.stderr)
+        print()
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} phase(s) slower than the baseline by more than {args.threshold:.0%}.',
+                  file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
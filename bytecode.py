@@ -0,0 +1,147 @@
+from enum import IntEnum, auto
+
+
+class OpCode(IntEnum):
+    # Constants and literals
+    CONSTANT = auto()
+    ARRAY = auto()
+    CODE = auto()
+    FUNC = auto()
+    MEMO_FUNC = auto()
+
+    # Variables
+    LOAD_LOCAL = auto()
+    LOAD_OUTER = auto()
+    LOAD_GLOBAL = auto()
+    STORE_LOCAL = auto()
+    STORE_OUTER = auto()
+    STORE_GLOBAL = auto()
+    DEFINE_GLOBAL = auto()
+
+    # Arrays
+    INDEX = auto()
+    SET_INDEX = auto()
+
+    # Arithmetic
+    ADD = auto()
+    SUBTRACT = auto()
+    MULTIPLY = auto()
+    DIVIDE = auto()
+    MODULO = auto()
+    NEGATE = auto()
+    POSITIVE = auto()
+    CHECKED_ADD = auto()
+    CHECKED_MULTIPLY = auto()
+
+    # Comparison
+    EQUAL = auto()
+    NOT_EQUAL = auto()
+    GREATER = auto()
+    GREATER_EQUAL = auto()
+    LESS = auto()
+    LESS_EQUAL = auto()
+
+    # Control flow
+    JUMP = auto()
+    JUMP_IF_FALSE = auto()
+    JUMP_IF_TRUE = auto()
+    JUMP_IF_FALSE_OR_POP = auto()
+    JUMP_IF_TRUE_OR_POP = auto()
+    CALL = auto()
+    TAIL_CALL = auto()
+    RETURN = auto()
+    HALT = auto()
+
+    # Builtins
+    LEN = auto()
+    PRINT = auto()
+
+    # Stack manipulation
+    POP = auto()
+    DUP = auto()
+    DUP_TWO = auto()
+
+
+# Number of operands following each opcode in the instruction stream.
+OPERAND_COUNT = dict.fromkeys(OpCode, 0)
+OPERAND_COUNT.update(dict.fromkeys((
+    OpCode.CONSTANT, OpCode.ARRAY, OpCode.CODE, OpCode.FUNC, OpCode.MEMO_FUNC,
+    OpCode.LOAD_GLOBAL, OpCode.STORE_GLOBAL, OpCode.DEFINE_GLOBAL,
+    OpCode.JUMP, OpCode.JUMP_IF_FALSE, OpCode.JUMP_IF_TRUE,
+    OpCode.JUMP_IF_FALSE_OR_POP, OpCode.JUMP_IF_TRUE_OR_POP,
+    OpCode.CALL, OpCode.TAIL_CALL, OpCode.PRINT,
+), 1))
+OPERAND_COUNT.update(dict.fromkeys((OpCode.LOAD_LOCAL, OpCode.STORE_LOCAL), 2))
+OPERAND_COUNT.update(dict.fromkeys((OpCode.LOAD_OUTER, OpCode.STORE_OUTER), 3))
+
+# Opcodes whose first operand is an index into the constant pool.
+CONSTANT_OPS = {
+    OpCode.CONSTANT, OpCode.CODE, OpCode.FUNC, OpCode.MEMO_FUNC,
+    OpCode.LOAD_LOCAL, OpCode.LOAD_OUTER, OpCode.LOAD_GLOBAL,
+    OpCode.STORE_LOCAL, OpCode.STORE_OUTER, OpCode.STORE_GLOBAL, OpCode.DEFINE_GLOBAL,
+    OpCode.PRINT,
+}
+
+
+class Chunk():
+    def __init__(self, name):
+        self.name = name
+        self.code = []
+        self.constants = []
+        self.lines = []
+        self._constant_index = {}
+
+    def emit(self, op, line, *operands):
+        self.code.append(op)
+        self.code.extend(operands)
+        self.lines.extend([line] * (len(operands) + 1))
+        # Return the position of the last operand so jumps can be patched.
+        return len(self.code) - 1
+
+    def add_constant(self, value):
+        # Numbers, strings and nil are shared; functions always get their own slot.
+        if value is None or type(value) in (float, int, str):
+            key = (type(value), value)
+            if key not in self._constant_index:
+                self.constants.append(value)
+                self._constant_index[key] = len(self.constants) - 1
+            return self._constant_index[key]
+
+        self.constants.append(value)
+        return len(self.constants) - 1
+
+    def patch(self, operand_index, value):
+        self.code[operand_index] = value
+
+    def __str__(self):
+        lines = [f'== {self.name} ==']
+        ip = 0
+        while ip < len(self.code):
+            op = self.code[ip]
+            operands = self.code[ip + 1:ip + 1 + OPERAND_COUNT[op]]
+            line = '%04d %-20s %s' % (ip, op.name, ' '.join(str(o) for o in operands))
+            if op in CONSTANT_OPS:
+                line += ' (%r)' % (self.constants[operands[0]],)
+            lines.append(line.rstrip())
+            ip += 1 + len(operands)
+        return '\n'.join(lines)
+
+    __repr__ = __str__
+
+
+class Function():
+    def __init__(self, name, params, chunk, frame_size, encloses_functions=False, frame=None):
+        self.name = name
+        self.params = params  # a list of parameter names
+        self.chunk = chunk
+        self.frame_size = frame_size
+        self.encloses_functions = encloses_functions  # whether its frames can outlive its calls
+        self.frame = frame  # the frame the function was declared in
+
+    def bind(self, frame):
+        return Function(self.name, self.params, self.chunk, self.frame_size, self.encloses_functions, frame)
+
+    def __str__(self):
+        return '<func {name}({params})>'.format(name=self.name, params=', '.join(self.params))
+
+    __repr__ = __str__
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+from scanner import Scanner
+from token_parser import Parser
+
+# Bump whenever the AST classes or token literals change, so stale cache files are ignored.
+CACHE_FORMAT = 4
+CACHE_VERSION = f'coizc-{CACHE_FORMAT}-py{sys.version_info[0]}.{sys.version_info[1]}'
+CACHE_DIR = '__coizcache__'
+
+# Set to False to always scan and parse from source.
+enabled = True
+
+
+class CachedParser():
+    """Stands in for a Parser whose tree was loaded from a cache file."""
+    def __init__(self, tree, filename):
+        self.tree = tree
+        self.filename = filename
+        self.has_error = False
+
+    def parse(self):
+        return self.tree
+
+
+def cache_path(path):
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, CACHE_DIR, os.path.splitext(name)[0] + '.coizc')
+
+
+def source_hash(source):
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def load(path, source):
+    """Returns the cached tree for the source at path, or None if there is no fresh one."""
+    try:
+        with open(cache_path(path), 'rb') as f:
+            version, digest, tree = pickle.load(f)
+    except Exception:
+        return None
+    if version != CACHE_VERSION or digest != source_hash(source):
+        return None
+    return tree
+
+
+def store(path, source, tree):
+    """Writes tree to the cache file for path, replacing any older file atomically."""
+    target = cache_path(path)
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        data = pickle.dumps((CACHE_VERSION, source_hash(source), tree), pickle.HIGHEST_PROTOCOL)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, target)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    except (OSError, RecursionError, pickle.PicklingError):
+        # Caching is best effort; the program still runs from source.
+        pass
+
+
+def parse_source(source, filename, path=None):
+    """
+    Returns a parser holding the parsed program, or None if it has scanning errors.
+
+    If path is given, the tree is read from its cache file when that is fresh and
+    written to it after a clean parse otherwise.
+    """
+    use_cache = enabled and path is not None
+    if use_cache:
+        tree = load(path, source)
+        if tree is not None:
+            return CachedParser(tree, filename)
+
+    scanner = Scanner(source, filename)
+    parser = Parser(scanner)
+    tree = parser.parse()
+    if scanner.has_error:
+        return None
+
+    if use_cache and not parser.has_error:
+        store(path, source, tree)
+    return parser
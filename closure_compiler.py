@@ -0,0 +1,502 @@
+import operator
+
+from analysis import analyze
+from ast import FuncCall
+from base_classes import NodeVisitor
+from code_runner import CodeRunner
+from interpreter import Frame, Function, Scope
+import memo
+from native import NativeFunction
+from optimizer import Optimizer
+from output import writer
+from resolver import Resolver
+from symbol_table import SemanticAnalyzer
+from token import TokenType
+
+BINARY_OPS = {
+    TokenType.PLUS: operator.add,
+    TokenType.MINUS: operator.sub,
+    TokenType.STAR: operator.mul,
+    TokenType.SLASH: operator.truediv,
+    TokenType.PERCENT: operator.mod,
+    TokenType.EQUAL_EQUAL: operator.eq,
+    TokenType.BANG_EQUAL: operator.ne,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+}
+
+ASSIGN_OPS = {
+    TokenType.PLUS_EQUAL: operator.add,
+    TokenType.MINUS_EQUAL: operator.sub,
+    TokenType.STAR_EQUAL: operator.mul,
+    TokenType.SLASH_EQUAL: operator.truediv,
+}
+
+
+class CompiledFunction():
+    def __init__(self, name, params, body, frame_size, frame=None):
+        self.name = name
+        self.params = params  # a list of parameter names
+        self.body = body
+        self.frame_size = frame_size
+        self.frame = frame  # the frame the function was declared in
+
+    def bind(self, frame):
+        return CompiledFunction(self.name, self.params, self.body, self.frame_size, frame)
+
+    def __str__(self):
+        return '<func {name}({params})>'.format(name=self.name, params=', '.join(self.params))
+
+    __repr__ = __str__
+
+
+class TailCall():
+    """Returned by a statement in place of a return value to call function next."""
+    def __init__(self, function, args):
+        self.function = function
+        self.args = args
+
+
+def call_function(function, args):
+    """Calls a compiled function with args from Python and returns its value."""
+    while True:
+        new_frame = Frame(function.frame_size, function.frame)
+        new_frame.slots[:len(args)] = args
+        result = function.body(new_frame)
+        if type(result) != TailCall:
+            return None if result is None else result[0]
+        function = result.function
+        args = result.args
+
+
+def make_sequence(stmts):
+    """Runs statements in order, stopping at the first one that returns."""
+    if len(stmts) == 1:
+        return stmts[0]
+
+    def sequence(frame):
+        for stmt in stmts:
+            result = stmt(frame)
+            if result is not None:
+                return result
+    return sequence
+
+
+class ClosureCompiler(NodeVisitor):
+    """
+    Compiles each AST node once into a Python closure taking the current frame.
+
+    Expression closures return their value. Statement closures return None, or
+    a one-element tuple holding the return value when a return statement ran.
+    """
+    def __init__(self, global_scope):
+        self.global_scope = global_scope
+        self.globals = global_scope.variables
+        self.code_runner = CodeRunner()
+        self.output = writer
+
+    def compile(self, tree):
+        return self.visit(tree)
+
+    def compile_function(self, node):
+        params = [param.var_node.value for param in node.params]
+        return CompiledFunction(node.name, params, self.visit(node.block_node), node.frame_size)
+
+    def import_value(self, data):
+        if type(data) == Function:
+            return self.compile_function(data.decl)
+        # Memoized functions of imported files are compiled and memoized again, so
+        # they do not call the interpreter of the file.
+        if type(data) == NativeFunction and data.memoized is not None:
+            function = self.compile_function(data.memoized.decl)
+            return memo.memoize(data.name, data.params, lambda args: call_function(function, args), function)
+        return data
+
+    def statement(self, node):
+        stmt = self.visit(node)
+        # Calls used as statements must not be mistaken for a return.
+        if type(node) == FuncCall:
+            def call_stmt(frame):
+                stmt(frame)
+            return call_stmt
+        return stmt
+
+    def loader(self, name, depth, slot):
+        if slot is None:
+            variables = self.globals
+            bind_lazy = self.global_scope.bind_lazy
+
+            def load(frame):
+                val = variables.get(name)
+                if val is None:
+                    val = bind_lazy(name)
+                    if val is None:
+                        raise NameError(repr(name))
+                return val
+        elif depth == 0:
+            def load(frame):
+                val = frame.slots[slot]
+                if val is None:
+                    raise NameError(repr(name))
+                return val
+        else:
+            def load(frame):
+                for _ in range(depth):
+                    frame = frame.parent
+                val = frame.slots[slot]
+                if val is None:
+                    raise NameError(repr(name))
+                return val
+        return load
+
+    def storer(self, name, depth, slot):
+        if slot is None:
+            variables = self.globals
+            bind_lazy = self.global_scope.bind_lazy
+
+            def store(frame, value):
+                if variables.get(name) is None and bind_lazy(name) is None:
+                    raise NameError(name)
+                variables[name] = value
+        elif depth == 0:
+            def store(frame, value):
+                frame.slots[slot] = value
+        else:
+            def store(frame, value):
+                for _ in range(depth):
+                    frame = frame.parent
+                frame.slots[slot] = value
+        return store
+
+    def visit_Arg(self, node):
+        return self.visit(node.expr)
+
+    def visit_Array(self, node):
+        exprs = [self.visit(expr) for expr in node.array]
+
+        def array(frame):
+            return [expr(frame) for expr in exprs]
+        return array
+
+    def visit_AssertStmt(self, node):
+        condition = self.visit(node.condition)
+        print_stmt = self.visit(node.print_stmt)
+
+        def assert_stmt(frame):
+            if not condition(frame):
+                print_stmt(frame)
+        return assert_stmt
+
+    def visit_Assign(self, node):
+        var = node.left
+        load = self.loader(var.value, var.depth, var.slot)
+        right = self.visit(node.right)
+
+        if node.index is None:
+            store = self.storer(var.value, var.depth, var.slot)
+            if node.token.type == TokenType.EQUAL:
+                if var.slot is not None and var.depth == 0:
+                    slot = var.slot
+
+                    def assign(frame):
+                        frame.slots[slot] = right(frame)
+                else:
+                    def assign(frame):
+                        store(frame, right(frame))
+            else:
+                op = ASSIGN_OPS[node.token.type]
+                if var.slot is not None and var.depth == 0:
+                    slot = var.slot
+
+                    def assign(frame):
+                        slots = frame.slots
+                        slots[slot] = op(slots[slot], right(frame))
+                else:
+                    def assign(frame):
+                        store(frame, op(load(frame), right(frame)))
+        else:
+            index = self.visit(node.index)
+            if node.token.type == TokenType.EQUAL:
+                def assign(frame):
+                    i = index(frame)
+                    if type(i) == float:
+                        i = int(i)
+                    load(frame)[i] = right(frame)
+            else:
+                op = ASSIGN_OPS[node.token.type]
+
+                def assign(frame):
+                    i = index(frame)
+                    if type(i) == float:
+                        i = int(i)
+                    array = load(frame)
+                    array[i] = op(array[i], right(frame))
+        return assign
+
+    def visit_BinOp(self, node):
+        return self.binary(node)
+
+    def binary(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        op = BINARY_OPS[node.op.type]
+
+        def binop(frame):
+            return op(left(frame), right(frame))
+        return binop
+
+    def visit_Block(self, node):
+        return make_sequence([self.statement(child) for child in node.stmt_list])
+
+    def visit_Code(self, node):
+        run = self.code_runner.run
+
+        def code(frame):
+            return run(node)
+        return code
+
+    def visit_Compound(self, node):
+        return make_sequence([self.statement(child) for child in node.children])
+
+    def visit_ForStmt(self, node):
+        init_stmt = self.visit(node.init_stmt)
+        condition = self.visit(node.condition)
+        assign_stmt = self.statement(node.assign_stmt)
+        block = self.visit(node.block)
+
+        def for_stmt(frame):
+            init_stmt(frame)
+            while condition(frame):
+                result = block(frame)
+                if result is not None:
+                    return result
+                assign_stmt(frame)
+        return for_stmt
+
+    def visit_FuncCall(self, node):
+        load = self.loader(node.name, node.depth, node.slot)
+        args = [self.visit(arg) for arg in node.args]
+
+        def func_call(frame):
+            function = load(frame)
+            if type(function) == NativeFunction:
+                return function.function(*[arg(frame) for arg in args])
+            new_frame = Frame(function.frame_size, function.frame)
+            slots = new_frame.slots
+            for i, arg in enumerate(args):
+                slots[i] = arg(frame)
+            result = function.body(new_frame)
+
+            # Tail calls run here, in a loop, instead of nesting Python calls.
+            while type(result) == TailCall:
+                function = result.function
+                new_frame = Frame(function.frame_size, function.frame)
+                new_frame.slots[:len(result.args)] = result.args
+                result = function.body(new_frame)
+            if result is not None:
+                return result[0]
+        return func_call
+
+    def visit_FuncDecl(self, node):
+        function = self.compile_function(node)
+        store = self.definer(node.name, node.slot)
+
+        if memo.memoizable(node):
+            def func_decl(frame):
+                bound = function.bind(frame)
+                store(frame, memo.memoize(bound.name, bound.params, lambda args: call_function(bound, args), bound))
+        else:
+            def func_decl(frame):
+                store(frame, function.bind(frame))
+        return func_decl
+
+    def definer(self, name, slot):
+        if slot is None:
+            variables = self.globals
+
+            def define(frame, value):
+                variables[name] = value
+        else:
+            def define(frame, value):
+                frame.slots[slot] = value
+        return define
+
+    def visit_FuncLen(self, node):
+        expr = self.visit(node.expr)
+
+        def func_len(frame):
+            return len(expr(frame))
+        return func_len
+
+    def visit_IfElse(self, node):
+        condition = self.visit(node.condition)
+        if_block = self.visit(node.if_block)
+
+        if node.else_block:
+            else_block = self.visit(node.else_block)
+
+            def if_else(frame):
+                if condition(frame):
+                    return if_block(frame)
+                return else_block(frame)
+        else:
+            def if_else(frame):
+                if condition(frame):
+                    return if_block(frame)
+        return if_else
+
+    def visit_ImportStmt(self, node):
+        # Imports are resolved by the semantic analyzer before compilation.
+        return self.visit_NoOp(node)
+
+    def visit_Logical(self, node):
+        if node.op.type not in (TokenType.AND, TokenType.OR):
+            return self.binary(node)
+
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if node.op.type == TokenType.AND:
+            def logical(frame):
+                return left(frame) and right(frame)
+        else:
+            def logical(frame):
+                return left(frame) or right(frame)
+        return logical
+
+    def visit_NoOp(self, node):
+        def no_op(frame):
+            pass
+        return no_op
+
+    def visit_Num(self, node):
+        value = node.value
+
+        def num(frame):
+            return value
+        return num
+
+    def visit_PrintStmt(self, node):
+        args = [self.visit(arg) for arg in node.args]
+        render = node.template.render
+        write = self.output.write
+
+        def print_stmt(frame):
+            write(render([arg(frame) for arg in args]))
+        return print_stmt
+
+    def visit_ReturnStmt(self, node):
+        if node.tail_call:
+            return self.tail_call(node.expr)
+        expr = self.visit(node.expr)
+
+        def return_stmt(frame):
+            return (expr(frame),)
+        return return_stmt
+
+    def tail_call(self, node):
+        load = self.loader(node.name, node.depth, node.slot)
+        args = [self.visit(arg) for arg in node.args]
+
+        def tail_call(frame):
+            function = load(frame)
+            if type(function) == NativeFunction:
+                return (function.function(*[arg(frame) for arg in args]),)
+            return TailCall(function, [arg(frame) for arg in args])
+        return tail_call
+
+    def visit_String(self, node):
+        return self.visit_Num(node)
+
+    def visit_UnaryOp(self, node):
+        expr = self.visit(node.expr)
+        if node.op.type == TokenType.MINUS:
+            def unary(frame):
+                return -expr(frame)
+        else:
+            def unary(frame):
+                return +expr(frame)
+        return unary
+
+    def visit_Var(self, node):
+        load = self.loader(node.value, node.depth, node.slot)
+        if node.index is None:
+            return load
+
+        index = self.visit(node.index)
+
+        def var(frame):
+            i = index(frame)
+            if type(i) == float:
+                i = int(i)
+            return load(frame)[i]
+        return var
+
+    def visit_VarDecl(self, node):
+        define = self.definer(node.left.value, node.left.slot)
+        right = self.visit(node.right)
+
+        if node.left.slot is not None:
+            slot = node.left.slot
+
+            def var_decl(frame):
+                frame.slots[slot] = right(frame)
+        else:
+            def var_decl(frame):
+                define(frame, right(frame))
+        return var_decl
+
+    def visit_WhileStmt(self, node):
+        cond = self.visit(node.cond)
+        block = self.visit(node.block)
+
+        def while_stmt(frame):
+            while cond(frame):
+                result = block(frame)
+                if result is not None:
+                    return result
+        return while_stmt
+
+
+class ClosureInterpreter():
+    """Runs a program by compiling it into closures with the ClosureCompiler."""
+    def __init__(self, parser, optimize=0):
+        self.parser = parser
+        self.symantic_analyzer = SemanticAnalyzer()
+        self.optimizer = Optimizer(optimize)
+        self.resolver = Resolver()
+        self.global_scope = Scope("global", 1, None)
+        self.compiler = ClosureCompiler(self.global_scope)
+        self.output = writer  # where printed lines are written
+        self.frame = None
+
+    def interpret(self):
+        return self.execute(self.prepare())
+
+    def prepare(self):
+        """Runs every pass over the program and compiles it, returning the program to run."""
+        return self.load(self.analyze(), self.symantic_analyzer.imports)
+
+    def analyze(self):
+        """
+        Runs every pass over the program, returning the tree to compile.
+
+        The closures compiled from the tree hold on to the globals of one run, so
+        the tree, which can be loaded by any number of interpreters, is compiled
+        by load instead.
+        """
+        return analyze(self)
+
+    def load(self, tree, imports):
+        """Sets up the globals of an analyzed tree and the modules it imports, returning the compiled program."""
+        # Import variables and functions from imported files.
+        for module in imports:
+            module.export_to(self.global_scope, self.compiler.import_value)
+
+        self.frame = Frame(tree.frame_size, None)
+        self.compiler.output = self.output
+        return self.compiler.compile(tree)
+
+    def execute(self, program):
+        program(self.frame)
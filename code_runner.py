@@ -0,0 +1,73 @@
+import sys
+import threading
+from io import StringIO
+
+
+def compile_code(node):
+    """Compiles the Python source of a Code node."""
+    return compile(node.value, f'<code, line {node.token.line}>', 'exec')
+
+
+class ThreadStdout():
+    """
+    Stands in for sys.stdout, sending what a thread writes while it runs code to the
+    thread's buffer, and everything else to the stdout it replaced.
+    """
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.local = threading.local()
+
+    def target(self):
+        buffer = getattr(self.local, 'buffer', None)
+        return self.stdout if buffer is None else buffer
+
+    def write(self, text):
+        return self.target().write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.target(), name)
+
+
+install_lock = threading.Lock()
+
+
+def install_stdout():
+    """Returns the ThreadStdout in sys.stdout, replacing sys.stdout with one if it is not."""
+    with install_lock:
+        stdout = sys.stdout
+        if type(stdout) != ThreadStdout:
+            stdout = sys.stdout = ThreadStdout(stdout)
+        return stdout
+
+
+class CodeRunner():
+    """
+    Runs the Python code of a program's Code nodes, returning what it prints.
+
+    All the code of a program runs in one namespace, so names it defines stay
+    available to later code. Everything the code writes to sys.stdout is captured in
+    a single reused buffer. sys.stdout is replaced once, by a ThreadStdout, rather
+    than for every run, so programs running in other threads are not affected.
+    """
+    def __init__(self):
+        self.buffer = StringIO()
+        self.namespace = {'__name__': '__coizcode__'}
+
+    def run(self, node):
+        code = node.code
+        if code is None:
+            code = node.code = compile_code(node)
+
+        stdout = sys.stdout
+        if type(stdout) != ThreadStdout:
+            stdout = install_stdout()
+        buffer = self.buffer
+        buffer.seek(0)
+        buffer.truncate()
+        previous = getattr(stdout.local, 'buffer', None)
+        stdout.local.buffer = buffer
+        try:
+            exec(code, self.namespace)
+        finally:
+            stdout.local.buffer = previous
+        return buffer.getvalue()
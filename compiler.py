@@ -0,0 +1,279 @@
+from ast import FuncCall
+from base_classes import NodeVisitor
+from bytecode import Chunk, Function, OpCode
+import interpreter
+import memo
+from token import TokenType
+
+BINARY_OPS = {
+    TokenType.PLUS: OpCode.ADD,
+    TokenType.MINUS: OpCode.SUBTRACT,
+    TokenType.STAR: OpCode.MULTIPLY,
+    TokenType.SLASH: OpCode.DIVIDE,
+    TokenType.PERCENT: OpCode.MODULO,
+}
+
+ASSIGN_OPS = {
+    TokenType.PLUS_EQUAL: OpCode.ADD,
+    TokenType.MINUS_EQUAL: OpCode.SUBTRACT,
+    TokenType.STAR_EQUAL: OpCode.MULTIPLY,
+    TokenType.SLASH_EQUAL: OpCode.DIVIDE,
+}
+
+# The versions of ops emitted by a compiler checking sizes, which pass what they build to VM.check_size.
+CHECKED_OPS = {
+    OpCode.ADD: OpCode.CHECKED_ADD,
+    OpCode.MULTIPLY: OpCode.CHECKED_MULTIPLY,
+}
+
+COMPARISON_OPS = {
+    TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+    TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+    TokenType.GREATER: OpCode.GREATER,
+    TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+    TokenType.LESS: OpCode.LESS,
+    TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+}
+
+
+class Compiler(NodeVisitor):
+    """Lowers an analyzed AST into bytecode chunks for the VM."""
+    def __init__(self):
+        self.chunk = None
+        self.line = None
+        self.check_sizes = False  # set to emit the CHECKED_OPS versions of ops
+
+    def compile(self, tree, name='<script>'):
+        self.chunk = Chunk(name)
+        self.visit(tree)
+        self.emit(OpCode.HALT)
+        return self.chunk
+
+    def compile_function(self, node):
+        enclosing_chunk = self.chunk
+        self.chunk = Chunk(node.name)
+
+        self.visit(node.block_node)
+        self.emit(OpCode.CONSTANT, self.constant(None))
+        self.emit(OpCode.RETURN)
+
+        params = [param.var_node.value for param in node.params]
+        function = Function(node.name, params, self.chunk, node.frame_size, node.encloses_functions)
+        self.chunk = enclosing_chunk
+        return function
+
+    def emit(self, op, *operands):
+        return self.chunk.emit(op, self.line, *operands)
+
+    def arithmetic(self, op):
+        if self.check_sizes:
+            op = CHECKED_OPS.get(op, op)
+        self.emit(op)
+
+    def emit_jump(self, op):
+        return self.emit(op, None)
+
+    def patch_jump(self, operand_index):
+        self.chunk.patch(operand_index, len(self.chunk.code))
+
+    def constant(self, value):
+        return self.chunk.add_constant(value)
+
+    def mark(self, token):
+        if token is not None:
+            self.line = token.line
+
+    def statement(self, node):
+        self.visit(node)
+        # Calls used as statements leave an unused return value behind.
+        if type(node) == FuncCall:
+            self.emit(OpCode.POP)
+
+    def load(self, name, depth, slot):
+        if slot is None:
+            self.emit(OpCode.LOAD_GLOBAL, self.constant(name))
+        elif depth == 0:
+            self.emit(OpCode.LOAD_LOCAL, self.constant(name), slot)
+        else:
+            self.emit(OpCode.LOAD_OUTER, self.constant(name), depth, slot)
+
+    def store(self, name, depth, slot):
+        if slot is None:
+            self.emit(OpCode.STORE_GLOBAL, self.constant(name))
+        elif depth == 0:
+            self.emit(OpCode.STORE_LOCAL, self.constant(name), slot)
+        else:
+            self.emit(OpCode.STORE_OUTER, self.constant(name), depth, slot)
+
+    def define(self, name, slot):
+        if slot is None:
+            self.emit(OpCode.DEFINE_GLOBAL, self.constant(name))
+        else:
+            self.emit(OpCode.STORE_LOCAL, self.constant(name), slot)
+
+    def visit_Arg(self, node):
+        self.visit(node.expr)
+
+    def visit_Array(self, node):
+        for expr in node.array:
+            self.visit(expr)
+        self.emit(OpCode.ARRAY, len(node.array))
+
+    def visit_AssertStmt(self, node):
+        self.visit(node.condition)
+        skip = self.emit_jump(OpCode.JUMP_IF_TRUE)
+        self.visit(node.print_stmt)
+        self.patch_jump(skip)
+
+    def visit_Assign(self, node):
+        self.mark(node.token)
+        var = node.left
+        if node.index is None:
+            if node.token.type == TokenType.EQUAL:
+                self.visit(node.right)
+            else:
+                self.load(var.value, var.depth, var.slot)
+                self.visit(node.right)
+                self.arithmetic(ASSIGN_OPS[node.token.type])
+            self.store(var.value, var.depth, var.slot)
+        else:
+            self.load(var.value, var.depth, var.slot)
+            self.visit(node.index)
+            if node.token.type == TokenType.EQUAL:
+                self.visit(node.right)
+            else:
+                self.emit(OpCode.DUP_TWO)
+                self.emit(OpCode.INDEX)
+                self.visit(node.right)
+                self.arithmetic(ASSIGN_OPS[node.token.type])
+            self.emit(OpCode.SET_INDEX)
+
+    def visit_BinOp(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+        self.mark(node.op)
+        self.arithmetic(BINARY_OPS[node.op.type])
+
+    def visit_Block(self, node):
+        for child in node.stmt_list:
+            self.statement(child)
+
+    def visit_Code(self, node):
+        self.mark(node.token)
+        self.emit(OpCode.CODE, self.constant(node))
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            self.statement(child)
+
+    def visit_ForStmt(self, node):
+        self.visit(node.init_stmt)
+
+        loop_start = len(self.chunk.code)
+        self.visit(node.condition)
+        exit_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+        self.visit(node.block)
+        self.statement(node.assign_stmt)
+        self.emit(OpCode.JUMP, loop_start)
+        self.patch_jump(exit_jump)
+
+    def visit_FuncCall(self, node):
+        self.load(node.name, node.depth, node.slot)
+        for arg in node.args:
+            self.visit(arg)
+        self.emit(OpCode.CALL, len(node.args))
+
+    def visit_FuncDecl(self, node):
+        op = OpCode.MEMO_FUNC if memo.memoizable(node) else OpCode.FUNC
+        self.emit(op, self.constant(self.compile_function(node)))
+        self.define(node.name, node.slot)
+
+    def visit_FuncLen(self, node):
+        self.visit(node.expr)
+        self.emit(OpCode.LEN)
+
+    def visit_IfElse(self, node):
+        self.visit(node.condition)
+        else_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+        self.visit(node.if_block)
+
+        if node.else_block:
+            end_jump = self.emit_jump(OpCode.JUMP)
+            self.patch_jump(else_jump)
+            self.visit(node.else_block)
+            self.patch_jump(end_jump)
+        else:
+            self.patch_jump(else_jump)
+
+    def visit_ImportStmt(self, node):
+        # Imports are resolved by the semantic analyzer before compilation.
+        pass
+
+    def visit_Logical(self, node):
+        self.visit(node.left)
+        if node.op.type in (TokenType.AND, TokenType.OR):
+            op = OpCode.JUMP_IF_FALSE_OR_POP if node.op.type == TokenType.AND else OpCode.JUMP_IF_TRUE_OR_POP
+            end_jump = self.emit_jump(op)
+            self.visit(node.right)
+            self.patch_jump(end_jump)
+        else:
+            self.visit(node.right)
+            self.mark(node.op)
+            self.emit(COMPARISON_OPS[node.op.type])
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_Num(self, node):
+        self.emit(OpCode.CONSTANT, self.constant(node.value))
+
+    def visit_PrintStmt(self, node):
+        for arg in node.args:
+            self.visit(arg)
+        self.emit(OpCode.PRINT, self.constant(node.template))
+
+    def visit_ReturnStmt(self, node):
+        if node.tail_call:
+            call = node.expr
+            self.load(call.name, call.depth, call.slot)
+            for arg in call.args:
+                self.visit(arg)
+            # A native function returns its value here, to the RETURN that follows.
+            self.emit(OpCode.TAIL_CALL, len(call.args))
+        else:
+            self.visit(node.expr)
+        self.emit(OpCode.RETURN)
+
+    def visit_String(self, node):
+        self.emit(OpCode.CONSTANT, self.constant(node.value))
+
+    def visit_UnaryOp(self, node):
+        self.visit(node.expr)
+        self.emit(OpCode.NEGATE if node.op.type == TokenType.MINUS else OpCode.POSITIVE)
+
+    def visit_Var(self, node):
+        self.mark(node.token)
+        self.load(node.value, node.depth, node.slot)
+        if node.index is not None:
+            self.visit(node.index)
+            self.emit(OpCode.INDEX)
+
+    def visit_VarDecl(self, node):
+        self.mark(node.token)
+        self.visit(node.right)
+        self.define(node.left.value, node.left.slot)
+
+    def visit_WhileStmt(self, node):
+        loop_start = len(self.chunk.code)
+        self.visit(node.cond)
+        exit_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+        self.visit(node.block)
+        self.emit(OpCode.JUMP, loop_start)
+        self.patch_jump(exit_jump)
+
+    def import_value(self, data):
+        # Imported files are executed by the tree-walking interpreter; translate their
+        # function declarations into VM functions.
+        if type(data) == interpreter.Function:
+            return self.compile_function(data.decl)
+        return data
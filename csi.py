@@ -1,40 +1,193 @@
+import argparse
+import atexit
+import json
 import sys
 
-from scanner import Scanner
-from token_parser import Parser
-from interpreter import Interpreter
+import cache
+import memo
+import modules
+import output
+from governor import GOVERNED_ENGINES, Limits, ResourceLimitError
+from profiler import Profiler
+from runtime import ENGINES
+from server import Client, Server
+from session import Session
 
 
-def run_file(filename):
+def run_file(filename, engine='tree', optimize=0, profiler=None, limits=None):
     with open(filename, 'r') as f:
-        had_error = run(f.read(), filename)
+        source = f.read()
+    try:
+        had_error = run(source, filename, engine, optimize, path=filename, profiler=profiler, limits=limits)
+    except ResourceLimitError as e:
+        report_limit(filename, e)
+        sys.exit(70)
     if had_error:
         sys.exit(65)
 
 
-def run_prompt():
+def run_prompt(engine='tree', optimize=0, limits=None):
+    # Every line runs in the same session, so declarations and imports carry over to later lines.
+    session = Session(engine, optimize, limits)
     while True:
-        source = input("> ")
-        run(source, "")
+        try:
+            source = input("> ")
+        except EOFError:
+            print()
+            return
+        try:
+            session.run(source)
+        except ResourceLimitError as e:
+            report_limit("", e)
+        except Exception as e:
+            print(f"{type(e).__name__}: {e}")
 
 
-def run(source, filename):
-    scanner = Scanner(source, filename)
-    scanner.scan_tokens()
-    if scanner.has_error:
+def report_limit(filename, error):
+    if error.line is None:
+        print(f"[{filename}] Error: {error}")
+    else:
+        print(f"[{filename}, line {error.line}] Error: {error}")
+
+
+def run(source, filename, engine='tree', optimize=0, path=None, profiler=None, limits=None):
+    # The parsed program is cached only for sources read from a file.
+    parser = cache.parse_source(source, filename, path)
+    if parser is None:
         return True
 
-    parser = Parser(scanner)
-    interpreter = Interpreter(parser)
-    interpreter.interpret()
+    if limits:
+        interpreter = GOVERNED_ENGINES[engine](parser, limits, optimize)
+    else:
+        interpreter = ENGINES[engine](parser, optimize)
+    if profiler is not None:
+        profiler.attach(interpreter)
+    try:
+        interpreter.interpret()
+    finally:
+        output.writer.flush()
     return False
 
 
-if __name__ == '__main__':
-    if len(sys.argv) > 2:
-        print("Usage: python csi.py [script]")
-        sys.exit(64)
-    elif len(sys.argv) == 2:
-        run_file(sys.argv[1])
+def serve(path, workers=None, preload=(), engine='tree', optimize=0, limits=None):
+    with Server(path, workers, preload, engine, optimize, limits) as server:
+        print(f"Serving on {path} with {server.stats.workers} workers.", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def connect(path, filename=None, engine=None, optimize=None):
+    """
+    Runs a script on the server listening on path, or prints its statistics if no
+    script is given. The script runs with the server's engine and optimization
+    level unless others are given.
+    """
+    client = Client(path)
+    try:
+        if filename is None:
+            print(json.dumps(client.stats(), indent=2))
+            return
+        options = {}
+        if engine is not None:
+            options['engine'] = engine
+        if optimize is not None:
+            options['optimize'] = optimize
+        with open(filename, 'r') as f:
+            response = client.run(f.read(), filename, **options)
+    finally:
+        client.close()
+    sys.stdout.write(response.get('output') or '')
+    if not response['ok']:
+        sys.stderr.write(response['error'])
+        sys.exit(70 if 'limit' in response else 65)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog='csi.py', description='Coizscript interpreter.')
+    arg_parser.add_argument('script', nargs='?', help='script to run; opens a prompt if omitted')
+    arg_parser.add_argument('--engine', choices=ENGINES.keys(),
+                            help='execution engine: tree-walking interpreter, bytecode VM or '
+                                 'compiled closures (default: tree)')
+    arg_parser.add_argument('-O', dest='optimize', type=int, choices=(0, 1, 2),
+                            help='optimization level: 1 folds constants, 2 also removes dead code (default: 0)')
+    arg_parser.add_argument('--no-cache', dest='cache', action='store_false',
+                            help='do not read or write parsed programs in __coizcache__ directories')
+    arg_parser.add_argument('--lazy-imports', action='store_true',
+                            help='run the declarations of imported files that only declare names the '
+                                 'first time each name is used')
+    arg_parser.add_argument('--no-native', dest='native', action='store_false',
+                            help='import lib/math and lib/arrays from their .coiz sources')
+    arg_parser.add_argument('--memoize', action='store_true',
+                            help='cache the results of pure functions and report cache hits at exit')
+    arg_parser.add_argument('--memo-size', type=int, default=memo.max_size,
+                            help=f'number of results cached per function (default: {memo.max_size})')
+    arg_parser.add_argument('--output-buffer', metavar='SIZE', type=int, default=output.writer.size,
+                            help='characters of output held before they are written, when not writing to a '
+                                 f'terminal (default: {output.writer.size})')
+    arg_parser.add_argument('--profile', action='store_true',
+                            help='time every function and line of the script and report them at exit')
+    arg_parser.add_argument('--profile-json', metavar='FILE',
+                            help='also write the profile to FILE as JSON (implies --profile)')
+    arg_parser.add_argument('--max-steps', type=int,
+                            help='stop the script after it runs this many statements and loop iterations '
+                                 '(loop iterations and calls with the vm engine)')
+    arg_parser.add_argument('--max-time', metavar='SECONDS', type=float,
+                            help='stop the script after it runs for this many seconds')
+    arg_parser.add_argument('--max-depth', type=int, help='stop the script when its calls nest this deep')
+    arg_parser.add_argument('--max-heap', metavar='BYTES', type=int,
+                            help='stop the script when its variables and arrays take up about this many bytes')
+    arg_parser.add_argument('--serve', metavar='SOCKET',
+                            help='run the scripts sent to the Unix socket SOCKET in a pool of worker processes')
+    arg_parser.add_argument('--workers', type=int,
+                            help='worker processes started by --serve (default: one per CPU)')
+    arg_parser.add_argument('--preload', metavar='MODULE', action='append', default=[],
+                            help='import MODULE before the workers of --serve are started; may be repeated')
+    arg_parser.add_argument('--connect', metavar='SOCKET',
+                            help='run the script on the server listening on SOCKET, or print its '
+                                 'statistics if no script is given')
+    args = arg_parser.parse_args(argv)
+    # --connect sends the engine and optimization level only if they are given.
+    engine = 'tree' if args.engine is None else args.engine
+    optimize = 0 if args.optimize is None else args.optimize
+    cache.enabled = args.cache
+    modules.registry.lazy = args.lazy_imports
+    modules.registry.native = args.native
+    memo.enabled = args.memoize
+    memo.max_size = args.memo_size
+    output.writer.size = args.output_buffer
+    if args.memoize:
+        atexit.register(memo.report)
+
+    limits = Limits(args.max_steps, args.max_time, args.max_depth, args.max_heap)
+    if limits and engine not in GOVERNED_ENGINES:
+        arg_parser.error(f'the {engine} engine cannot enforce limits')
+
+    profiler = None
+    if args.profile or args.profile_json:
+        if engine != 'tree':
+            arg_parser.error('--profile needs the tree engine')
+        if not args.script:
+            arg_parser.error('--profile needs a script')
+        if limits:
+            arg_parser.error('--profile cannot be used with limits')
+        profiler = Profiler()
+        atexit.register(profiler.report)
+        if args.profile_json:
+            atexit.register(profiler.write_json, args.profile_json)
+
+    if args.serve:
+        if args.script:
+            arg_parser.error('--serve does not take a script')
+        serve(args.serve, args.workers, args.preload, engine, optimize, limits)
+    elif args.connect:
+        connect(args.connect, args.script, args.engine, args.optimize)
+    elif args.script:
+        run_file(args.script, engine, optimize, profiler, limits)
     else:
-        run_prompt()
+        run_prompt(engine, optimize, limits)
+
+
+if __name__ == '__main__':
+    main()
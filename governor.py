@@ -0,0 +1,344 @@
+import sys
+from time import perf_counter
+
+from bytecode import Function
+from interpreter import RETURN, Frame, Interpreter
+from native import NativeFunction
+from vector import Vector
+from vm import SUSPENDED, VM
+
+# Methods of GovernedInterpreter replaced by their checked_ versions under a heap limit.
+SIZE_CHECKED_METHODS = ('visit_Add', 'visit_Multiply', 'visit_AddAssign', 'visit_MultiplyAssign')
+
+# Values whose size grows with their length, and is checked as they are built under a heap limit.
+SIZED_TYPES = (list, str, Vector)
+
+# What each limit is called in errors.
+LIMIT_NAMES = {
+    'steps': 'Step',
+    'time': 'Time',
+    'depth': 'Call depth',
+    'heap': 'Heap',
+}
+
+
+class ResourceLimitError(Exception):
+    """Raised when a script exceeds one of the limits it runs under."""
+    def __init__(self, limit, maximum, value, line=None):
+        super().__init__(f"{LIMIT_NAMES[limit]} limit of {maximum} exceeded.")
+        self.limit = limit  # which of the Limits was exceeded
+        self.maximum = maximum
+        self.value = value  # how far the script had got past the limit
+        self.line = line  # the line being run, if known
+
+    def as_dict(self):
+        return {'limit': self.limit, 'maximum': self.maximum, 'value': self.value, 'line': self.line}
+
+
+class Limits():
+    """
+    Bounds on a single execution of a script. A limit left as None is not enforced.
+
+    steps counts the statements and loop iterations run by the tree engine, and the
+    loop iterations and calls made by the vm engine. time is in seconds of wall-clock
+    time, depth in nested calls and heap in bytes of the values the script can reach.
+    Time and heap are checked every interval steps, and every array, string or vector
+    built by + or *, or returned by an imported native function, is also checked
+    against the heap limit as it is built, so values that double in size at every
+    step, or are allocated all at once, cannot outgrow it before the next check.
+    """
+    def __init__(self, steps=None, time=None, depth=None, heap=None, interval=1000):
+        self.steps = steps
+        self.time = time
+        self.depth = depth
+        self.heap = heap
+        self.interval = interval
+
+    def __bool__(self):
+        return any(limit is not None for limit in (self.steps, self.time, self.depth, self.heap))
+
+
+def value_size(value):
+    """Returns the size in bytes of value, including the elements of a vector."""
+    if type(value) == Vector:
+        return sys.getsizeof(value) + len(value.data) * value.data.itemsize
+    return sys.getsizeof(value)
+
+
+def heap_size(values):
+    """Returns the approximate size in bytes of values and the arrays they hold, counting each array once."""
+    size = 0
+    seen = set()
+    pending = [values]
+    while pending:
+        values = pending.pop()
+        size += sum(map(value_size, values))
+        for array in [value for value in values if type(value) == list]:
+            if id(array) not in seen:
+                seen.add(id(array))
+                pending.append(array)
+    return size
+
+
+def frame_values(frames):
+    """Returns the values in frames and the frames enclosing them, visiting each frame once."""
+    values = []
+    seen = set()
+    for frame in frames:
+        while frame is not None and id(frame) not in seen:
+            seen.add(id(frame))
+            values.extend(frame.slots)
+            frame = frame.parent
+    return values
+
+
+class Governor():
+    """Enforces Limits on one execution, given the progress an engine reports to it."""
+    def __init__(self, limits):
+        self.limits = limits
+        self.steps = 0
+        self.deadline = None
+        # An array, string or vector takes at most 8 bytes per element and 80 more, so
+        # only longer ones can exceed the heap limit by themselves and need measuring.
+        self.max_length = None if limits.heap is None else (limits.heap - 80) // 8
+
+    def size_checked(self, function, line):
+        """
+        Returns a NativeFunction that calls function and checks the size of what it
+        returns. line returns the line being run, if known.
+        """
+        call = function.function
+        max_length = self.max_length
+
+        def checked(*args):
+            value = call(*args)
+            if type(value) in SIZED_TYPES and len(value) > max_length:
+                self.check_size(value, line())
+            return value
+        return NativeFunction(function.name, function.params, checked)
+
+    def start(self):
+        self.steps = 0
+        if self.limits.time is not None:
+            self.deadline = perf_counter() + self.limits.time
+
+    def next_check(self, depth=None):
+        """
+        Returns the number of steps that may run before the limits are checked again.
+        depth is the current call depth, if calls are only checked with the other limits.
+        """
+        limits = self.limits
+        count = limits.interval
+        if limits.steps is not None:
+            count = min(count, limits.steps - self.steps + 1)
+        if limits.depth is not None and depth is not None:
+            # Every call is a step, so the depth cannot be exceeded before the next check.
+            count = min(count, limits.depth - depth + 1)
+        return max(count, 1)
+
+    def check_size(self, value, line=None):
+        size = value_size(value)
+        if size > self.limits.heap:
+            raise ResourceLimitError('heap', self.limits.heap, size, line)
+
+    def check(self, depth, roots, line=None):
+        """Raises ResourceLimitError if a limit is exceeded. roots returns the values the script can reach."""
+        limits = self.limits
+        if limits.steps is not None and self.steps > limits.steps:
+            raise ResourceLimitError('steps', limits.steps, self.steps, line)
+        if limits.depth is not None and depth > limits.depth:
+            raise ResourceLimitError('depth', limits.depth, depth, line)
+        if self.deadline is not None:
+            now = perf_counter()
+            if now > self.deadline:
+                raise ResourceLimitError('time', limits.time, round(now - self.deadline + limits.time, 6), line)
+        if limits.heap is not None:
+            size = heap_size(roots())
+            if size > limits.heap:
+                raise ResourceLimitError('heap', limits.heap, size, line)
+
+
+class GovernedInterpreter(Interpreter):
+    """
+    A tree-walking interpreter that runs scripts under Limits.
+
+    Statements are counted as blocks run them and loop iterations as loops run
+    them, and the call depth is checked on the way into call_function. Only scripts
+    run with limits use it, so the plain Interpreter pays nothing for it.
+    """
+    def __init__(self, parser, limits, optimize=0):
+        super().__init__(parser, optimize)
+        self.governor = Governor(limits)
+        self.countdown = 0  # steps left until the limits are checked
+        self.slice = 0  # steps between the last check and the next
+        self.line = None  # the line of the last statement stepped through
+        self.calling_frames = []  # the frames of the calls in progress
+        if limits.heap is not None:
+            for name in SIZE_CHECKED_METHODS:
+                setattr(self, name, getattr(self, 'checked_' + name))
+
+    def import_value(self, data):
+        data = super().import_value(data)
+        # Memoized functions are built from checked operations already.
+        if type(data) == NativeFunction and data.memoized is None and self.governor.max_length is not None:
+            return self.governor.size_checked(data, lambda: self.line)
+        return data
+
+    def execute(self, tree):
+        # Calls a failed run left unfinished are not counted against the next one.
+        self.calling_frames = []
+        self.governor.start()
+        self.slice = self.countdown = self.governor.next_check()
+        return super().execute(tree)
+
+    def check(self):
+        governor = self.governor
+        governor.steps += self.slice
+        governor.check(len(self.calling_frames), self.roots, self.line)
+        self.slice = self.countdown = governor.next_check()
+
+    def roots(self):
+        return list(self.global_scope.variables.values()) + frame_values(self.calling_frames + [self.frame])
+
+    # Each step sets the line and counts down to the next check inline, as a method
+    # call per statement would cost more than the rest of the counting.
+
+    def visit_Block(self, node):
+        for child in node.stmt_list:
+            self.line = child.line
+            self.countdown -= 1
+            if not self.countdown:
+                self.check()
+            if self.visit(child) is RETURN:
+                return RETURN
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            self.line = child.line
+            self.countdown -= 1
+            if not self.countdown:
+                self.check()
+            self.visit(child)
+
+    def visit_ForStmt(self, node):
+        self.visit(node.init_stmt)
+        while self.visit(node.condition):
+            self.line = node.line
+            self.countdown -= 1
+            if not self.countdown:
+                self.check()
+            if self.visit(node.block) is RETURN:
+                return RETURN
+            self.visit(node.assign_stmt)
+
+    def visit_WhileStmt(self, node):
+        while self.visit(node.cond):
+            self.line = node.line
+            self.countdown -= 1
+            if not self.countdown:
+                self.check()
+            if self.visit(node.block) is RETURN:
+                return RETURN
+
+    def call_function(self, function, args):
+        self.calling_frames.append(self.frame)
+        try:
+            limit = self.governor.limits.depth
+            if limit is not None and len(self.calling_frames) > limit:
+                raise ResourceLimitError('depth', limit, len(self.calling_frames), function.decl.line)
+            return super().call_function(function, args)
+        finally:
+            self.calling_frames.pop()
+
+    # Versions of the methods in SIZE_CHECKED_METHODS that check the size of what they build.
+
+    def checked_visit_Add(self, node):
+        value = self.visit(node.left) + self.visit(node.right)
+        if type(value) in SIZED_TYPES and len(value) > self.governor.max_length:
+            self.governor.check_size(value, self.line)
+        return value
+
+    def checked_visit_Multiply(self, node):
+        value = self.visit(node.left) * self.visit(node.right)
+        if type(value) in SIZED_TYPES and len(value) > self.governor.max_length:
+            self.governor.check_size(value, self.line)
+        return value
+
+    def checked_visit_AddAssign(self, node):
+        var = node.left
+        new_val = self.lookup(var.value, var.depth, var.slot) + self.visit(node.right)
+        if type(new_val) in SIZED_TYPES and len(new_val) > self.governor.max_length:
+            self.governor.check_size(new_val, self.line)
+        self.update(var.value, var.depth, var.slot, new_val)
+
+    def checked_visit_MultiplyAssign(self, node):
+        var = node.left
+        new_val = self.lookup(var.value, var.depth, var.slot) * self.visit(node.right)
+        if type(new_val) in SIZED_TYPES and len(new_val) > self.governor.max_length:
+            self.governor.check_size(new_val, self.line)
+        self.update(var.value, var.depth, var.slot, new_val)
+
+
+class GovernedVM(VM):
+    """
+    A virtual machine that runs scripts under Limits.
+
+    The script runs in slices of at most interval loop iterations and calls, using
+    the budget of VM.run, and the limits are checked between slices. Under a heap
+    limit, the script is compiled with the checked versions of + and *.
+    """
+    def __init__(self, parser, limits, optimize=0):
+        super().__init__(parser, optimize)
+        self.governor = Governor(limits)
+        self.lines = {}  # id of the code of each chunk of the script -> the lines of the chunk
+        self.compiler.check_sizes = limits.heap is not None
+
+    def import_value(self, data):
+        data = super().import_value(data)
+        if type(data) == NativeFunction and data.memoized is None and self.governor.max_length is not None:
+            return self.governor.size_checked(data, lambda: None)
+        return data
+
+    def execute(self, script):
+        chunks = [script.chunk]
+        while chunks:
+            chunk = chunks.pop()
+            self.lines[id(chunk.code)] = chunk.lines
+            chunks.extend(constant.chunk for constant in chunk.constants if type(constant) == Function)
+
+        self.governor.start()
+        return self.run_governed(script.chunk, self.frame)
+
+    def call_function(self, function, args):
+        # Memoized functions call back into the VM from Python, and their calls are governed as well.
+        chunk = self.call_chunk(function, args)
+        return self.run_governed(chunk, Frame(0, None))
+
+    def run_governed(self, chunk, frame):
+        governor = self.governor
+        budget = governor.next_check(0)
+        value = self.run(chunk, frame, budget)
+        while value is SUSPENDED:
+            governor.steps += budget
+            code, constants, ip, frame, frames, stack = self.suspended
+            lines = self.lines.get(id(code))
+            governor.check(len(frames), self.roots, lines[ip] if lines else None)
+            budget = governor.next_check(len(frames))
+            value = self.resume(budget)
+        return value
+
+    def check_size(self, value, code, ip):
+        if len(value) > self.governor.max_length:
+            lines = self.lines.get(id(code))
+            self.governor.check_size(value, lines[ip] if lines else None)
+
+    def roots(self):
+        code, constants, ip, frame, frames, stack = self.suspended
+        return (list(self.global_scope.variables.values()) + stack
+                + frame_values([frame] + [caller[3] for caller in frames]))
+
+
+GOVERNED_ENGINES = {
+    'tree': GovernedInterpreter,
+    'vm': GovernedVM,
+}
@@ -1,11 +1,57 @@
 from token import TokenType
 from symbol_table import SemanticAnalyzer
+from analysis import analyze
 from base_classes import NodeVisitor
+from code_runner import CodeRunner
+from lowering import Lowering
+import memo
+from native import NativeFunction
+from optimizer import Optimizer
+from output import writer
+from resolver import Resolver
 
 
-class ReturnError(Exception):
-    def __init__(self, expr):
-        self.expr = expr
+# Returned by statements to signal that a return statement was executed.
+RETURN = object()
+
+# Events that handlers can be added for with Interpreter.add_hook, and the arguments
+# handlers are called with.
+HOOK_EVENTS = (
+    'function_enter',  # (decl, args) before the body of a function runs
+    'function_exit',  # (decl, value) after it, with the value it returns, or None if it raised
+    'statement',  # (node) before a statement runs
+    'statement_exit',  # (node) after it, or after it raised
+    'import',  # (module) when a module imported by the program is bound
+    'print',  # (text) before a line of text is printed
+)
+
+# Methods replaced by their hooked_ versions while an interpreter has hooks.
+HOOKED_METHODS = ('visit', 'call_function', 'visit_PrintStmt', 'visit_TailCallReturn')
+
+
+class Frame():
+    def __init__(self, size, parent):
+        self.slots = [None] * size
+        self.parent = parent  # the frame of the enclosing function
+
+
+class FramePool():
+    """Recycles the frames of calls to functions with a given frame size."""
+    def __init__(self, size):
+        self.size = size
+        self.blank = (None,) * size
+        self.frames = []
+
+
+class Function():
+    def __init__(self, decl, frame):
+        self.decl = decl
+        self.frame = frame  # the frame the function was declared in
+
+    def __str__(self):
+        return '<func {name}>'.format(name=self.decl.name)
+
+    __repr__ = __str__
 
 
 class Scope():
@@ -14,6 +60,7 @@ class Scope():
         self.scope_level = scope_level
         self.enclosing_scope = enclosing_scope
         self.variables = {}
+        self.lazy_imports = []  # (namespace, convert) pairs of lazily imported modules
 
     def insert(self, name, data):
         self.variables[name] = data
@@ -30,6 +77,7 @@ class Scope():
         # recursively go up the chain and lookup the name
         if self.enclosing_scope is not None:
             return self.enclosing_scope.lookup(name)
+        return self.bind_lazy(name)
 
     def update(self, name, value):
         try:
@@ -43,12 +91,24 @@ class Scope():
 
         if self.enclosing_scope is not None:
             return self.enclosing_scope.update(name, value)
+        elif self.bind_lazy(name) is not None:
+            self.variables[name] = value
         else:
             raise NameError(name)
 
     def import_vars(self, scope):
         self.variables.update(scope.variables)
 
+    def bind_lazy(self, name):
+        """Binds name from a lazily imported module on first use. Returns its value, or None."""
+        for namespace, convert in self.lazy_imports:
+            value = namespace.bind(name)
+            if value is not None:
+                if convert is not None:
+                    value = convert(value)
+                self.variables[name] = value
+                return value
+
     def __str__(self):
         msgs = []
         tab = ''.join(['  ' for _ in range(self.scope_level)])
@@ -64,21 +124,109 @@ class Scope():
 
 
 class Interpreter(NodeVisitor):
-    def __init__(self, parser):
+    def __init__(self, parser, optimize=0):
         self.parser = parser
         self.symantic_analyzer = SemanticAnalyzer()
-        self.current_scope = Scope("global", 1, None)
+        self.optimizer = Optimizer(optimize)
+        self.resolver = Resolver()
+        self.lowering = Lowering()
+        self.global_scope = Scope("global", 1, None)
+        self.code_runner = CodeRunner()
+        self.output = writer  # where printed lines are written
+        self.frame = None
+        self.frame_pools = {}
+        self.return_value = None
+        self.tail_call = None  # the (function, args) of a pending tail call
+        self.hooks = {event: [] for event in HOOK_EVENTS}
+        self.hooked_bodies = {}  # block node -> FuncDecl of the functions called while hooked
 
     def interpret(self):
-        tree = self.parser.parse()
-        self.symantic_analyzer.visit(tree)
-
-        # Import variables and functions from imported files.
-        for import_int in self.symantic_analyzer.imports:
-            self.current_scope.import_vars(import_int.current_scope)
+        return self.execute(self.prepare())
 
+    def execute(self, tree):
         return self.visit(tree)
 
+    def add_hook(self, event, handler):
+        """
+        Calls handler on every event of the given type from now on.
+
+        While no handlers are added, the interpreter runs without checking for them.
+        """
+        if event not in self.hooks:
+            raise ValueError(f"Unknown hook event {event!r}.")
+        self.hooks[event].append(handler)
+        for name in HOOKED_METHODS:
+            setattr(self, name, getattr(self, 'hooked_' + name))
+
+    def remove_hook(self, event, handler):
+        self.hooks[event].remove(handler)
+        if not any(self.hooks.values()):
+            for name in HOOKED_METHODS:
+                del self.__dict__[name]
+
+    def prepare(self):
+        """Runs every pass over the program and sets up its globals, returning the tree to run."""
+        return self.load(self.analyze(), self.symantic_analyzer.imports)
+
+    def analyze(self):
+        """
+        Runs every pass over the program, returning the tree to run.
+
+        The tree is not changed by running it, so it can be loaded by any number of
+        interpreters.
+        """
+        tree = analyze(self)
+        return self.lowering.lower(tree)
+
+    def load(self, tree, imports):
+        """Sets up the globals of an analyzed tree and the modules it imports, returning the tree."""
+        # Import variables and functions from imported files.
+        for module in imports:
+            module.export_to(self.global_scope, self.import_value)
+            for handler in self.hooks['import']:
+                handler(module)
+
+        self.frame = Frame(tree.frame_size, None)
+        return tree
+
+    def import_value(self, data):
+        # A memoized function of an imported file calls the file's interpreter, so it
+        # is memoized again to run on this one, under its hooks and limits.
+        if type(data) == NativeFunction and data.memoized is not None:
+            function = data.memoized
+            return memo.memoize(data.name, data.params, lambda args: self.call_function(function, args), function)
+        return data
+
+    def lookup(self, name, depth, slot):
+        if slot is None:
+            data = self.global_scope.variables.get(name)
+            if data is None:
+                data = self.global_scope.bind_lazy(name)
+        else:
+            frame = self.frame
+            for _ in range(depth):
+                frame = frame.parent
+            data = frame.slots[slot]
+
+        if data is None:
+            raise NameError(repr(name))
+        return data
+
+    def update(self, name, depth, slot, value):
+        if slot is None:
+            self.global_scope.update(name, value)
+        else:
+            frame = self.frame
+            for _ in range(depth):
+                frame = frame.parent
+            frame.slots[slot] = value
+
+    def define(self, name, slot, value):
+        if slot is None:
+            self.global_scope.insert(name, value)
+        else:
+            self.frame.slots[slot] = value
+
     def visit_Array(self, node):
         array = []
         for expr in node.array:
@@ -90,45 +238,38 @@ class Interpreter(NodeVisitor):
             self.visit(node.print_stmt)
 
     def visit_Assign(self, node):
-        var_name = node.left.value
+        var = node.left
         if node.index is None:
             if node.token.type == TokenType.EQUAL:
                 result = self.visit(node.right)
-                self.current_scope.update(var_name, result)
+                self.update(var.value, var.depth, var.slot, result)
             elif node.token.type == TokenType.PLUS_EQUAL:
-                new_val = self.current_scope.lookup(var_name) + self.visit(node.right)
-                self.current_scope.update(var_name, new_val)
+                new_val = self.lookup(var.value, var.depth, var.slot) + self.visit(node.right)
+                self.update(var.value, var.depth, var.slot, new_val)
             elif node.token.type == TokenType.MINUS_EQUAL:
-                new_val = self.current_scope.lookup(var_name) - self.visit(node.right)
-                self.current_scope.update(var_name, new_val)
+                new_val = self.lookup(var.value, var.depth, var.slot) - self.visit(node.right)
+                self.update(var.value, var.depth, var.slot, new_val)
             elif node.token.type == TokenType.STAR_EQUAL:
-                new_val = self.current_scope.lookup(var_name) * self.visit(node.right)
-                self.current_scope.update(var_name, new_val)
+                new_val = self.lookup(var.value, var.depth, var.slot) * self.visit(node.right)
+                self.update(var.value, var.depth, var.slot, new_val)
             elif node.token.type == TokenType.SLASH_EQUAL:
-                new_val = self.current_scope.lookup(var_name) / self.visit(node.right)
-                self.current_scope.update(var_name, new_val)
+                new_val = self.lookup(var.value, var.depth, var.slot) / self.visit(node.right)
+                self.update(var.value, var.depth, var.slot, new_val)
         else:
-            i = int(self.visit(node.index))
+            i = self.visit(node.index)
+            if type(i) == float:
+                i = int(i)
+            val_arr = self.lookup(var.value, var.depth, var.slot)
             if node.token.type == TokenType.EQUAL:
-                val_arr = self.current_scope.lookup(var_name)
                 val_arr[i] = self.visit(node.right)
-                self.current_scope.update(var_name, val_arr)
             elif node.token.type == TokenType.PLUS_EQUAL:
-                val_arr = self.current_scope.lookup(var_name)
                 val_arr[i] += self.visit(node.right)
-                self.current_scope.update(var_name, val_arr)
             elif node.token.type == TokenType.MINUS_EQUAL:
-                val_arr = self.current_scope.lookup(var_name)
                 val_arr[i] -= self.visit(node.right)
-                self.current_scope.update(var_name, val_arr)
             elif node.token.type == TokenType.STAR_EQUAL:
-                val_arr = self.current_scope.lookup(var_name)
                 val_arr[i] *= self.visit(node.right)
-                self.current_scope.update(var_name, val_arr)
             elif node.token.type == TokenType.SLASH_EQUAL:
-                val_arr = self.current_scope.lookup(var_name)
                 val_arr[i] /= self.visit(node.right)
-                self.current_scope.update(var_name, val_arr)
 
     def visit_BinOp(self, node):
         if node.op.type == TokenType.PLUS:
@@ -143,97 +284,88 @@ class Interpreter(NodeVisitor):
             return self.visit(node.left) % self.visit(node.right)
 
     def visit_Block(self, node):
-        # Create new scope
-        new_scope = Scope("block", self.current_scope.scope_level + 1, self.current_scope)
-        self.current_scope = new_scope
-
         for child in node.stmt_list:
-            self.visit(child)
-
-        self.current_scope = self.current_scope.enclosing_scope
+            if self.visit(child) is RETURN:
+                return RETURN
 
     def visit_Code(self, node):
-        from io import StringIO
-        import sys
-        old_stdout = sys.stdout
-        redirected_output = sys.stdout = StringIO()
-        try:
-            exec(node.value)
-        except Exception as e:
-            print(e)
-            raise e
-        sys.stdout = old_stdout
-        return redirected_output.getvalue()
+        return self.code_runner.run(node)
 
     def visit_Compound(self, node):
         for child in node.children:
             self.visit(child)
 
     def visit_ForStmt(self, node):
-        # Create new scope.
-
-        new_scope = Scope("for", self.current_scope.scope_level + 1, self.current_scope)
-        self.current_scope = new_scope
-
         self.visit(node.init_stmt)
         while self.visit(node.condition):
-            self.visit(node.block)
+            if self.visit(node.block) is RETURN:
+                return RETURN
             self.visit(node.assign_stmt)
 
-        self.current_scope = self.current_scope.enclosing_scope
-
     def visit_FuncCall(self, node):
-        func_decl = self.current_scope.lookup(node.name)
-        if not func_decl:
-            raise NameError(repr(node.name))
-        block = func_decl.block_node
-
-        # Create new scope.
-        calling_scope = self.current_scope
-        new_scope = Scope(node.name, self.current_scope.scope_level + 1, self.current_scope)
-        self.current_scope = new_scope
-
-        # Put argument values into new scope.
-        if node.args:
-            arg_values = []
-            for arg in node.args:
-                arg_values.append(self.visit(arg.expr))
-            for arg_value, param in zip(arg_values,  func_decl.params):
-                self.current_scope.insert(param.var_node.value, arg_value)
+        function = self.lookup(node.name, node.depth, node.slot)
+        if type(function) == NativeFunction:
+            return function.function(*[self.visit(arg.expr) for arg in node.args])
+        return self.call_function(function, [self.visit(arg.expr) for arg in node.args])
+
+    def call_function(self, function, args):
+        calling_frame = self.frame
+        while True:
+            func_decl = function.decl
+
+            # Take a frame from the pool, or create one if the pool is empty.
+            pool = self.frame_pools.get(func_decl.frame_size)
+            if pool is None:
+                pool = self.frame_pools[func_decl.frame_size] = FramePool(func_decl.frame_size)
+            if pool.frames:
+                new_frame = pool.frames.pop()
+                new_frame.parent = function.frame
+            else:
+                new_frame = Frame(func_decl.frame_size, function.frame)
 
-        try:
-            self.visit(block)
-        except ReturnError as e:
-            return_val = self.visit(e.expr)
-            self.current_scope = calling_scope
-            return return_val
+            # Put argument values into the new frame.
+            slots = new_frame.slots
+            slots[:len(args)] = args
+
+            self.frame = new_frame
+            if self.visit(func_decl.block_node) is RETURN:
+                return_val = self.return_value
+                self.return_value = None
+            else:
+                return_val = None
 
-        self.current_scope = calling_scope
-        return None
+            # Frames of functions declaring nested functions may be kept alive by them.
+            if not func_decl.encloses_functions:
+                slots[:] = pool.blank
+                new_frame.parent = None
+                pool.frames.append(new_frame)
+
+            # A tail call runs here, in a loop, instead of nesting another call.
+            if self.tail_call is None:
+                break
+            function, args = self.tail_call
+            self.tail_call = None
+
+        self.frame = calling_frame
+        return return_val
 
     def visit_FuncDecl(self, node):
-        self.current_scope.insert(node.name, node)
+        function = Function(node, self.frame)
+        if memo.memoizable(node):
+            params = [param.var_node.value for param in node.params]
+            self.define(node.name, node.slot, memo.memoize(node.name, params,
+                                                           lambda args: self.call_function(function, args), function))
+        else:
+            self.define(node.name, node.slot, function)
 
     def visit_FuncLen(self, node):
         return len(self.visit(node.expr))
 
     def visit_IfElse(self, node):
         if self.visit(node.condition):
-            # Create new scope.
-            new_scope = Scope("if", self.current_scope.scope_level + 1, self.current_scope)
-            self.current_scope = new_scope
-
-            self.visit(node.if_block)
-
-            self.current_scope = self.current_scope.enclosing_scope
+            return self.visit(node.if_block)
         elif node.else_block:
-            # Create new scope.
-            new_scope = Scope("else", self.current_scope.scope_level + 1, self.current_scope)
-            self.current_scope = new_scope
-
-            self.visit(node.else_block)
-
-            self.current_scope = self.current_scope.enclosing_scope
+            return self.visit(node.else_block)
 
     def visit_ImportStmt(self, node):
         pass
@@ -257,35 +389,16 @@ class Interpreter(NodeVisitor):
             return self.visit(node.left) < self.visit(node.right)
 
     def visit_PrintStmt(self, node):
-        formatted_args = []
-        for arg in node.args:
-            result = self.visit(arg)
-            # If result is a float, check if it is an integer. If so, truncate the decimal portion.
-            if type(result) == float and round(result) == result:
-                    formatted_args.append(int(result))
-            elif type(result) == list:
-                formatted_args.append([int(e) for e in result if round(e) == e])
-            else:
-                formatted_args.append(result)
-
-        if len(node.args) == 1:
-            print(formatted_args[0])
-        # Printf syntax
-        else:
-            print(formatted_args[0] % tuple(formatted_args[1:]))
+        self.output.write(node.template.render([self.visit(arg) for arg in node.args]))
 
     def visit_ReturnStmt(self, node):
-        raise ReturnError(node.expr)
+        self.return_value = self.visit(node.expr)
+        return RETURN
 
     def visit_WhileStmt(self, node):
-        # Create new scope.
-        new_scope = Scope("while", self.current_scope.scope_level + 1, self.current_scope)
-        self.current_scope = new_scope
-
         while self.visit(node.cond):
-            self.visit(node.block)
-
-        self.current_scope = self.current_scope.enclosing_scope
+            if self.visit(node.block) is RETURN:
+                return RETURN
 
     def visit_NoOp(self, node):
         pass
@@ -304,17 +417,200 @@ class Interpreter(NodeVisitor):
         return node.value
 
     def visit_Var(self, node):
-        var_name = node.value
-        val = self.current_scope.lookup(var_name)
-        if val is None:
-            raise NameError(repr(var_name))
-        else:
-            if node.index is not None:
-                i = int(self.visit(node.index))
-                return val[i]
-            return val
+        val = self.lookup(node.value, node.depth, node.slot)
+        if node.index is not None:
+            i = self.visit(node.index)
+            if type(i) == float:
+                i = int(i)
+            return val[i]
+        return val
 
     def visit_VarDecl(self, node):
-        var_name = node.left.value
         var_value = self.visit(node.right)
-        self.current_scope.insert(var_name, var_value)
+        self.define(node.left.value, node.left.slot, var_value)
+
+    # Operator-specific nodes produced by the Lowering pass.
+
+    def visit_Add(self, node):
+        return self.visit(node.left) + self.visit(node.right)
+
+    def visit_Subtract(self, node):
+        return self.visit(node.left) - self.visit(node.right)
+
+    def visit_Multiply(self, node):
+        return self.visit(node.left) * self.visit(node.right)
+
+    def visit_Divide(self, node):
+        return self.visit(node.left) / self.visit(node.right)
+
+    def visit_Modulo(self, node):
+        return self.visit(node.left) % self.visit(node.right)
+
+    def visit_And(self, node):
+        return self.visit(node.left) and self.visit(node.right)
+
+    def visit_Or(self, node):
+        return self.visit(node.left) or self.visit(node.right)
+
+    def visit_Equal(self, node):
+        return self.visit(node.left) == self.visit(node.right)
+
+    def visit_NotEqual(self, node):
+        return self.visit(node.left) != self.visit(node.right)
+
+    def visit_Greater(self, node):
+        return self.visit(node.left) > self.visit(node.right)
+
+    def visit_GreaterEqual(self, node):
+        return self.visit(node.left) >= self.visit(node.right)
+
+    def visit_Less(self, node):
+        return self.visit(node.left) < self.visit(node.right)
+
+    def visit_LessEqual(self, node):
+        return self.visit(node.left) <= self.visit(node.right)
+
+    def visit_Negate(self, node):
+        return -self.visit(node.expr)
+
+    def visit_Positive(self, node):
+        return +self.visit(node.expr)
+
+    def visit_LocalVar(self, node):
+        val = self.frame.slots[node.slot]
+        if val is None:
+            raise NameError(repr(node.value))
+        return val
+
+    def visit_GlobalVar(self, node):
+        val = self.global_scope.variables.get(node.value)
+        if val is None:
+            val = self.global_scope.bind_lazy(node.value)
+        if val is None:
+            raise NameError(repr(node.value))
+        return val
+
+    def visit_SimpleAssign(self, node):
+        var = node.left
+        self.update(var.value, var.depth, var.slot, self.visit(node.right))
+
+    def visit_AddAssign(self, node):
+        var = node.left
+        new_val = self.lookup(var.value, var.depth, var.slot) + self.visit(node.right)
+        self.update(var.value, var.depth, var.slot, new_val)
+
+    def visit_SubtractAssign(self, node):
+        var = node.left
+        new_val = self.lookup(var.value, var.depth, var.slot) - self.visit(node.right)
+        self.update(var.value, var.depth, var.slot, new_val)
+
+    def visit_MultiplyAssign(self, node):
+        var = node.left
+        new_val = self.lookup(var.value, var.depth, var.slot) * self.visit(node.right)
+        self.update(var.value, var.depth, var.slot, new_val)
+
+    def visit_DivideAssign(self, node):
+        var = node.left
+        new_val = self.lookup(var.value, var.depth, var.slot) / self.visit(node.right)
+        self.update(var.value, var.depth, var.slot, new_val)
+
+    def visit_IndexedAssign(self, node):
+        i = self.visit(node.index)
+        if type(i) == float:
+            i = int(i)
+        self.lookup(node.left.value, node.left.depth, node.left.slot)[i] = self.visit(node.right)
+
+    def visit_IndexedAddAssign(self, node):
+        i = self.visit(node.index)
+        if type(i) == float:
+            i = int(i)
+        self.lookup(node.left.value, node.left.depth, node.left.slot)[i] += self.visit(node.right)
+
+    def visit_IndexedSubtractAssign(self, node):
+        i = self.visit(node.index)
+        if type(i) == float:
+            i = int(i)
+        self.lookup(node.left.value, node.left.depth, node.left.slot)[i] -= self.visit(node.right)
+
+    def visit_IndexedMultiplyAssign(self, node):
+        i = self.visit(node.index)
+        if type(i) == float:
+            i = int(i)
+        self.lookup(node.left.value, node.left.depth, node.left.slot)[i] *= self.visit(node.right)
+
+    def visit_IndexedDivideAssign(self, node):
+        i = self.visit(node.index)
+        if type(i) == float:
+            i = int(i)
+        self.lookup(node.left.value, node.left.depth, node.left.slot)[i] /= self.visit(node.right)
+
+    def visit_LocalAssign(self, node):
+        self.frame.slots[node.left.slot] = self.visit(node.right)
+
+    def visit_LocalIncrement(self, node):
+        slots = self.frame.slots
+        val = slots[node.left.slot]
+        if val is None:
+            raise NameError(repr(node.left.value))
+        slots[node.left.slot] = val + node.amount
+
+    def visit_TailCallReturn(self, node):
+        call = node.expr
+        function = self.lookup(call.name, call.depth, call.slot)
+        args = [self.visit(arg.expr) for arg in call.args]
+        if type(function) == NativeFunction:
+            self.return_value = function.function(*args)
+        else:
+            # The calling visit_FuncCall makes the call once this function has returned.
+            self.tail_call = (function, args)
+        return RETURN
+
+    # Versions of the methods in HOOKED_METHODS that call the hooks.
+
+    def hooked_visit(self, node):
+        visitor = getattr(self, 'visit_' + type(node).__name__, None)
+        if visitor is None:
+            visitor = self.find_visitor(type(node))
+
+        decl = self.hooked_bodies.get(node)
+        if decl is not None:
+            args = self.frame.slots[:len(decl.params)]
+            for handler in self.hooks['function_enter']:
+                handler(decl, args)
+            value = None
+            try:
+                result = visitor(node)
+                if result is RETURN and self.tail_call is None:
+                    value = self.return_value
+                return result
+            finally:
+                for handler in self.hooks['function_exit']:
+                    handler(decl, value)
+
+        if node.line is None:
+            return visitor(node)
+        for handler in self.hooks['statement']:
+            handler(node)
+        try:
+            return visitor(node)
+        finally:
+            for handler in self.hooks['statement_exit']:
+                handler(node)
+
+    def hooked_call_function(self, function, args):
+        # Function bodies are told apart from other blocks by hooked_visit.
+        self.hooked_bodies[function.decl.block_node] = function.decl
+        return type(self).call_function(self, function, args)
+
+    def hooked_visit_PrintStmt(self, node):
+        text = node.template.render([self.visit(arg) for arg in node.args])
+        for handler in self.hooks['print']:
+            handler(text)
+        self.output.write(text)
+
+    def hooked_visit_TailCallReturn(self, node):
+        result = type(self).visit_TailCallReturn(self, node)
+        if self.tail_call is not None:
+            decl = self.tail_call[0].decl
+            self.hooked_bodies[decl.block_node] = decl
+        return result
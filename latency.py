@@ -0,0 +1,20 @@
+import math
+import statistics
+
+
+def percentile(values, fraction):
+    """Returns the nearest-rank percentile of sorted values, such as 0.95 for the 95th."""
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def latency_stats(values):
+    """Returns the mean, median, 95th percentile and maximum of values, or None if there are none."""
+    values = sorted(values)
+    if not values:
+        return None
+    return {
+        'mean': statistics.mean(values),
+        'median': statistics.median(values),
+        'p95': percentile(values, 0.95),
+        'max': values[-1],
+    }
@@ -0,0 +1,109 @@
+from ast import *
+from base_classes import NodeVisitor
+from token import TokenType
+
+BINARY_NODES = {
+    TokenType.PLUS: Add,
+    TokenType.MINUS: Subtract,
+    TokenType.STAR: Multiply,
+    TokenType.SLASH: Divide,
+    TokenType.PERCENT: Modulo,
+}
+
+LOGICAL_NODES = {
+    TokenType.AND: And,
+    TokenType.OR: Or,
+    TokenType.EQUAL_EQUAL: Equal,
+    TokenType.BANG_EQUAL: NotEqual,
+    TokenType.GREATER: Greater,
+    TokenType.GREATER_EQUAL: GreaterEqual,
+    TokenType.LESS: Less,
+    TokenType.LESS_EQUAL: LessEqual,
+}
+
+ASSIGN_NODES = {
+    TokenType.EQUAL: SimpleAssign,
+    TokenType.PLUS_EQUAL: AddAssign,
+    TokenType.MINUS_EQUAL: SubtractAssign,
+    TokenType.STAR_EQUAL: MultiplyAssign,
+    TokenType.SLASH_EQUAL: DivideAssign,
+}
+
+INDEXED_ASSIGN_NODES = {
+    TokenType.EQUAL: IndexedAssign,
+    TokenType.PLUS_EQUAL: IndexedAddAssign,
+    TokenType.MINUS_EQUAL: IndexedSubtractAssign,
+    TokenType.STAR_EQUAL: IndexedMultiplyAssign,
+    TokenType.SLASH_EQUAL: IndexedDivideAssign,
+}
+
+
+def specialize(node, node_class):
+    """Returns a copy of node as an instance of node_class, a subclass of its type."""
+    new_node = node_class.__new__(node_class)
+    new_node.__dict__.update(node.__dict__)
+    return new_node
+
+
+class Lowering(NodeVisitor):
+    """
+    Rewrites resolved operator nodes into operator-specific node classes.
+
+    After lowering, an interpreter can evaluate every operator and assignment through
+    a dedicated visit method instead of inspecting the node's token at runtime.
+    """
+    def lower(self, tree):
+        return self.visit(tree)
+
+    def generic_visit(self, node):
+        # Lower the children of nodes that are not rewritten themselves.
+        for name, value in vars(node).items():
+            if isinstance(value, AST):
+                setattr(node, name, self.visit(value))
+            elif type(value) == list:
+                setattr(node, name, [self.visit(v) if isinstance(v, AST) else v for v in value])
+        return node
+
+    def visit_Assign(self, node):
+        node = self.generic_visit(node)
+        var = node.left
+        op = node.op.type
+
+        if node.index is not None:
+            return specialize(node, INDEXED_ASSIGN_NODES[op])
+
+        if var.slot is not None and var.depth == 0:
+            if op == TokenType.EQUAL:
+                return specialize(node, LocalAssign)
+            if op in (TokenType.PLUS_EQUAL, TokenType.MINUS_EQUAL) and type(node.right) == Num:
+                amount = node.right.value if op == TokenType.PLUS_EQUAL else -node.right.value
+                new_node = LocalIncrement(var, node.op, node.right, None, amount)
+                new_node.line = node.line
+                return new_node
+
+        return specialize(node, ASSIGN_NODES[op])
+
+    def visit_BinOp(self, node):
+        return specialize(self.generic_visit(node), BINARY_NODES[node.op.type])
+
+    def visit_Logical(self, node):
+        return specialize(self.generic_visit(node), LOGICAL_NODES[node.op.type])
+
+    def visit_ReturnStmt(self, node):
+        node = self.generic_visit(node)
+        if node.tail_call:
+            return specialize(node, TailCallReturn)
+        return node
+
+    def visit_UnaryOp(self, node):
+        node_class = Negate if node.op.type == TokenType.MINUS else Positive
+        return specialize(self.generic_visit(node), node_class)
+
+    def visit_Var(self, node):
+        node = self.generic_visit(node)
+        if node.index is None:
+            if node.slot is None:
+                return specialize(node, GlobalVar)
+            if node.depth == 0:
+                return specialize(node, LocalVar)
+        return node
@@ -0,0 +1,76 @@
+import sys
+from collections import OrderedDict
+
+from native import NativeFunction
+
+# Set to True to memoize the results of pure functions.
+enabled = False
+max_size = 1024
+
+# Results of these types cannot be changed by the caller, so they are safe to share.
+CACHEABLE_TYPES = (int, float, str)
+
+# Hit and miss counts by function name, for report. The cached results themselves
+# belong to the memoized function, and are freed along with it.
+stats = {}
+
+
+class MemoStats():
+    """The hits and misses of the caches of every function with a given name."""
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+
+
+def memoizable(decl):
+    # Tail calls already run in constant space; caching them would nest each call.
+    return enabled and decl.pure and not decl.tail_calls and decl.slot is None
+
+
+def memoize(name, params, call, function):
+    """
+    Returns a NativeFunction that calls call with a tuple of arguments, caching the
+    results by argument values. Arguments that cannot be hashed, such as arrays,
+    bypass the cache. function is the script function call runs, which engines
+    importing the NativeFunction memoize again to run it themselves.
+    """
+    counts = stats.get(name)
+    if counts is None:
+        counts = stats[name] = MemoStats(name)
+    entries = OrderedDict()
+    size = max_size
+
+    def memoized(*args):
+        # 1 and 1.0 are equal keys, but may give results of different types.
+        key = args + tuple(map(type, args))
+        try:
+            value = entries.get(key)
+        except TypeError:
+            counts.misses += 1
+            return call(args)
+        if value is not None:
+            counts.hits += 1
+            entries.move_to_end(key)
+            return value
+
+        counts.misses += 1
+        value = call(args)
+        if type(value) in CACHEABLE_TYPES:
+            entries[key] = value
+            if len(entries) > size:
+                entries.popitem(last=False)
+        return value
+
+    return NativeFunction(name, params, memoized, function)
+
+
+def report(file=sys.stderr):
+    """Prints the hit and miss counts of every memoized function that was called."""
+    rows = [(name, counts.hits, counts.misses) for name, counts in stats.items() if counts.hits or counts.misses]
+    if not rows:
+        return
+    print('Memoization:', file=file)
+    print('%-20s %10s %10s %8s' % ('function', 'hits', 'misses', 'hit rate'), file=file)
+    for name, hits, misses in sorted(rows, key=lambda row: -(row[1] + row[2])):
+        print('%-20s %10d %10d %7.1f%%' % (name, hits, misses, 100 * hits / (hits + misses)), file=file)
@@ -0,0 +1,142 @@
+import os
+import threading
+
+from ast import FuncDecl, ImportStmt, NoOp, VarDecl
+from cache import parse_source
+from interpreter import Function, Interpreter, Scope
+from native import NATIVE_MODULES, NativeFunction
+from symbol_table import FuncSymbol, VarSymbol
+
+# Top-level statements a module may contain to be imported lazily.
+DECLARATIONS = (FuncDecl, ImportStmt, NoOp, VarDecl)
+
+
+class LazyNamespace():
+    """
+    The top-level definitions of a module that has been analyzed but not run.
+
+    Each function or variable declaration is executed the first time its name is
+    looked up, so importing a large library only costs as much as the names used.
+    """
+    def __init__(self, interpreter, tree):
+        self.interpreter = interpreter
+        # Programs running in several threads may bind the same name. The lock is
+        # reentrant, as binding a declaration can bind the others it uses.
+        self.lock = threading.RLock()
+        self.decls = {}
+        self.symbols = []
+        for child in tree.children:
+            if type(child) == FuncDecl:
+                self.decls[child.name] = child
+                symbol = FuncSymbol(child.name, child.params)
+                symbol.pure = child.pure
+                self.symbols.append(symbol)
+            elif type(child) == VarDecl:
+                self.decls[child.left.value] = child
+                self.symbols.append(VarSymbol(child.left.value))
+
+    def bind(self, name):
+        """Returns the value of name in the module, or None if it does not define it."""
+        with self.lock:
+            decl = self.decls.pop(name, None)
+            if decl is not None:
+                self.interpreter.visit(decl)
+            return self.interpreter.global_scope.variables.get(name)
+
+
+class Module():
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.interpreter = None
+        self.scope = None  # the global scope of the module once it has loaded
+        self.namespace = None
+        self.symbols = []
+        self.loading = True
+
+    def export_to(self, scope, convert=None):
+        """Makes the names the module defines visible in scope, converting their values with convert."""
+        for name, data in self.scope.variables.items():
+            scope.variables[name] = data if convert is None else convert(data)
+        for namespace, _ in self.scope.lazy_imports:
+            scope.lazy_imports.append((namespace, convert))
+
+
+class ModuleRegistry():
+    """
+    Loads each imported file once per process, keyed by its resolved path.
+
+    Importing a file that is already loaded hands back the same module, so its
+    top-level code runs only once no matter how many files import it. A file that
+    is imported again while it is still loading, through an import cycle, exports
+    nothing to the file importing it.
+
+    If lazy is True, files that only declare functions and variables and import
+    other files are imported lazily: their declarations run on first use, so the
+    side effects of a variable's initializer happen then, if at all.
+    Files of the lib directory are replaced by the Python functions of the native
+    module unless native is False.
+    """
+    def __init__(self, lazy=False, native=True):
+        self.modules = {}
+        self.lazy = lazy
+        self.native = native
+
+    def load(self, name):
+        path = os.path.realpath(f'{name}.coiz')
+        module = self.modules.get(path)
+        if module is not None:
+            return module
+
+        module = Module(name, path)
+        self.modules[path] = module
+        if path in NATIVE_MODULES and (self.native or not os.path.exists(path)):
+            module.scope = Scope(name, 1, None)
+            module.scope.variables.update(NATIVE_MODULES[path])
+            module.symbols = self.exported_symbols(module)
+            module.loading = False
+            return module
+
+        try:
+            with open(path, 'r') as f:
+                source = f.read()
+            parser = parse_source(source, name, path)
+            if parser is not None:
+                module.interpreter = Interpreter(parser)
+                tree = module.interpreter.prepare()
+                if self.lazy and all(type(child) in DECLARATIONS for child in tree.children):
+                    module.namespace = LazyNamespace(module.interpreter, tree)
+                    # The module's own declarations take precedence over names it imports.
+                    module.interpreter.global_scope.lazy_imports.insert(0, (module.namespace, None))
+                else:
+                    module.interpreter.visit(tree)
+                module.scope = module.interpreter.global_scope
+                module.symbols = self.exported_symbols(module)
+        except BaseException:
+            del self.modules[path]
+            raise
+        finally:
+            module.loading = False
+        return module
+
+    def exported_symbols(self, module):
+        scope = module.scope
+        symbols = []
+        for var_name, data in scope.variables.items():
+            if type(data) == Function:
+                symbol = FuncSymbol(var_name, data.decl.params)
+                symbol.pure = data.decl.pure
+                symbols.append(symbol)
+            elif type(data) == NativeFunction:
+                # Native functions, including memoized ones, have no side effects.
+                symbol = FuncSymbol(var_name, data.params)
+                symbol.pure = True
+                symbols.append(symbol)
+            else:
+                symbols.append(VarSymbol(var_name))
+        for namespace, convert in scope.lazy_imports:
+            symbols.extend(namespace.symbols)
+        return symbols
+
+
+registry = ModuleRegistry()
@@ -0,0 +1,189 @@
+import math
+import os
+
+from vector import Vector, make_data, vector_dot, vector_max, vector_min, vector_range, vector_sum, vector_zeros
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'lib')
+
+
+class NativeFunction():
+    """A function implemented in Python that scripts call like any other function."""
+    def __init__(self, name, params, function, memoized=None):
+        self.name = name
+        self.params = params  # a list of parameter names
+        self.function = function
+        self.memoized = memoized  # the script function it caches the results of, if any
+
+    def __str__(self):
+        return '<native func {name}({params})>'.format(name=self.name, params=', '.join(self.params))
+
+    __repr__ = __str__
+
+
+# The functions below perform the same arithmetic, in the same order, as their
+# counterparts in the lib directory, so they give identical results.
+
+def math_abs(a):
+    if a < 0:
+        return -a
+    return a
+
+
+def math_ceil(n):
+    return -math_floor(-n)
+
+
+def math_cos(x):
+    return 1 - (math_exp(x, 2) / 2) + (math_exp(x, 4) / 24) - (math_exp(x, 6) / 720)
+
+
+def math_exp(base, pow):
+    total = 1
+    for _ in range(math.ceil(math_abs(pow))):
+        total *= base
+    if pow < 0:
+        total = 1 / total
+    return total
+
+
+def math_factorial(n):
+    factors = []
+    while n > 1:
+        factors.append(n)
+        n = n - 1
+    total = 1
+    for factor in reversed(factors):
+        total = factor * total
+    return total
+
+
+def math_floor(n):
+    return n - (n % 1)
+
+
+def math_round(n):
+    low = math_floor(n)
+    high = math_ceil(n)
+    if low == 0.5:
+        return high
+    if n - low < high - n:
+        return low
+    return high
+
+
+def math_sin(x):
+    return x - (math_exp(x, 3) / 6) + (math_exp(x, 5) / 120) - (math_exp(x, 7) / 5040)
+
+
+def math_sqrt(n):
+    x = n
+    y = 1
+    e = 0.00001
+    while math_abs(x - y) > e:
+        x = (x + y) / 2
+        y = n / x
+    if math_abs(x - math_floor(x)) < e:
+        x = math_floor(x)
+    return x
+
+
+def math_tan(x):
+    return math_sin(x) / math_cos(x)
+
+
+def arrays_append(arr, e):
+    return arr + [e]
+
+
+def arrays_count(arr, e):
+    return arr.count(e)
+
+
+def arrays_extend(arr, e):
+    return arr + e
+
+
+def arrays_find(arr, e):
+    for i, element in enumerate(arr):
+        if element == e:
+            return i
+    return -1
+
+
+def arrays_pop(arr, i):
+    if i > len(arr) - 1 or i < 0:
+        return arr
+    return [element for j, element in enumerate(arr) if j != i]
+
+
+def arrays_remove(arr, e):
+    return [element for element in arr if element != e]
+
+
+def arrays_reverse(arr):
+    return arr[::-1]
+
+
+def arrays_sum(arr):
+    total = 0
+    for element in arr:
+        total += element
+    return total
+
+
+def vectors_vector(arr):
+    if type(arr) == Vector:
+        arr = arr.data
+    return Vector(make_data(arr))
+
+
+vectors_dot = vector_dot
+vectors_max = vector_max
+vectors_min = vector_min
+vectors_range = vector_range
+vectors_sum = vector_sum
+vectors_zeros = vector_zeros
+
+
+def native_module(prefix, functions, variables=None):
+    values = dict(variables or {})
+    for name, params in functions.items():
+        values[name] = NativeFunction(name, params, globals()[f'{prefix}_{name}'])
+    return values
+
+
+# Native versions of the files in the lib directory, keyed by the file's path.
+NATIVE_MODULES = {
+    os.path.join(LIB_DIR, 'math.coiz'): native_module('math', {
+        'abs': ['a'],
+        'ceil': ['n'],
+        'cos': ['x'],
+        'exp': ['base', 'pow'],
+        'factorial': ['n'],
+        'floor': ['n'],
+        'round': ['n'],
+        'sin': ['x'],
+        'sqrt': ['n'],
+        'tan': ['x'],
+    }, {'E': 2.718281828459045, 'PI': 3.14159265358979323}),
+    os.path.join(LIB_DIR, 'arrays.coiz'): native_module('arrays', {
+        'append': ['arr', 'e'],
+        'count': ['arr', 'e'],
+        'extend': ['arr', 'e'],
+        'find': ['arr', 'e'],
+        'pop': ['arr', 'i'],
+        'remove': ['arr', 'e'],
+        'reverse': ['arr'],
+        'sum': ['arr'],
+    }),
+    # There is no .coiz source for vectors, so this module is always native.
+    os.path.join(LIB_DIR, 'vectors.coiz'): native_module('vectors', {
+        'dot': ['a', 'b'],
+        'max': ['v'],
+        'min': ['v'],
+        'range': ['start', 'stop', 'step'],
+        'sum': ['v'],
+        'vector': ['arr'],
+        'zeros': ['n'],
+    }),
+}
@@ -0,0 +1,141 @@
+import operator
+
+from ast import *
+from base_classes import NodeVisitor
+from token import Token, TokenType
+
+FOLDABLE_OPS = {
+    TokenType.PLUS: operator.add,
+    TokenType.MINUS: operator.sub,
+    TokenType.STAR: operator.mul,
+    TokenType.SLASH: operator.truediv,
+    TokenType.PERCENT: operator.mod,
+    TokenType.EQUAL_EQUAL: operator.eq,
+    TokenType.BANG_EQUAL: operator.ne,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+}
+
+
+def is_constant(node):
+    return type(node) == Num
+
+
+def make_num(value, token):
+    return Num(Token(TokenType.NUMBER, str(value), value, token.line))
+
+
+def terminates(node):
+    # True if executing node always ends in a return statement.
+    if type(node) == ReturnStmt:
+        return True
+    if type(node) == Block:
+        return any(terminates(stmt) for stmt in node.stmt_list)
+    if type(node) == IfElse:
+        return node.else_block is not None and terminates(node.if_block) and terminates(node.else_block)
+    return False
+
+
+class Optimizer(NodeVisitor):
+    """
+    Simplifies an analyzed AST before it is resolved and run.
+
+    Level 1 folds constant arithmetic and comparisons and drops empty statements.
+    Level 2 also removes if/else branches and while loops whose condition is
+    constant, and statements that can never be reached after a return.
+    """
+    def __init__(self, level=1):
+        self.level = level
+
+    def optimize(self, tree):
+        if self.level < 1:
+            return tree
+        return self.visit(tree)
+
+    def generic_visit(self, node):
+        for name, value in vars(node).items():
+            if isinstance(value, AST):
+                setattr(node, name, self.visit(value))
+            elif type(value) == list:
+                setattr(node, name, [self.visit(v) if isinstance(v, AST) else v for v in value])
+        return node
+
+    def statements(self, stmts):
+        results = []
+        for stmt in stmts:
+            stmt = self.visit(stmt)
+            if type(stmt) == NoOp:
+                continue
+            results.append(stmt)
+            if self.level >= 2 and terminates(stmt):
+                break
+        return results
+
+    def fold(self, node, left, right):
+        try:
+            value = FOLDABLE_OPS[node.op.type](left.value, right.value)
+        except (ArithmeticError, TypeError):
+            # Leave the error to be raised when the expression is evaluated.
+            return node
+        return make_num(value, node.op)
+
+    def visit_BinOp(self, node):
+        node = self.generic_visit(node)
+        if is_constant(node.left) and is_constant(node.right):
+            return self.fold(node, node.left, node.right)
+        return node
+
+    def visit_Block(self, node):
+        node.stmt_list = self.statements(node.stmt_list)
+        return node
+
+    def visit_Compound(self, node):
+        node.children = self.statements(node.children)
+        return node
+
+    def visit_FuncDecl(self, node):
+        node.block_node = self.visit(node.block_node)
+        return node
+
+    def visit_IfElse(self, node):
+        node = self.generic_visit(node)
+        if type(node.else_block) == NoOp:
+            node.else_block = None
+
+        if self.level >= 2 and is_constant(node.condition):
+            if node.condition.value:
+                return node.if_block
+            return node.else_block if node.else_block is not None else NoOp()
+        return node
+
+    def visit_Logical(self, node):
+        node = self.generic_visit(node)
+        if node.op.type in (TokenType.AND, TokenType.OR):
+            if not is_constant(node.left):
+                return node
+            # Both operators evaluate to their left operand when it decides the result.
+            if bool(node.left.value) == (node.op.type == TokenType.OR):
+                return node.left
+            return node.right
+
+        if is_constant(node.left) and is_constant(node.right):
+            return self.fold(node, node.left, node.right)
+        return node
+
+    def visit_UnaryOp(self, node):
+        node = self.generic_visit(node)
+        if is_constant(node.expr):
+            try:
+                value = -node.expr.value if node.op.type == TokenType.MINUS else +node.expr.value
+            except TypeError:
+                return node
+            return make_num(value, node.op)
+        return node
+
+    def visit_WhileStmt(self, node):
+        node = self.generic_visit(node)
+        if self.level >= 2 and is_constant(node.cond) and not node.cond.value:
+            return NoOp()
+        return node
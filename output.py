@@ -0,0 +1,156 @@
+import atexit
+import re
+import sys
+
+from ast import String
+
+# Matches one conversion of a printf-style format string.
+CONVERSION_PATTERN = re.compile(r'%([-+ #0]*\d*(?:\.\d+)?)([diouxXeEfFgGcrsa%])')
+
+# Format strings containing these are left for the % operator to handle.
+UNSUPPORTED_FORMAT = re.compile(r'%[-+ #0]*(?:\(|\*|\d*\.\*)')
+
+
+def format_value(result):
+    # If result is a float, check if it is an integer. If so, truncate the decimal portion.
+    if type(result) == float and round(result) == result:
+        return int(result)
+    elif type(result) == list:
+        return [int(e) for e in result if round(e) == e]
+    return result
+
+
+def format_print_args(values):
+    formatted_args = [format_value(result) for result in values]
+
+    if len(values) == 1:
+        return formatted_args[0]
+    # Printf syntax
+    return formatted_args[0] % tuple(formatted_args[1:])
+
+
+def convert_str(value):
+    return str(format_value(value))
+
+
+def convert_int(value):
+    if type(value) == int:
+        return str(value)
+    return '%d' % (value,)
+
+
+def make_converter(flags, conversion):
+    if not flags and conversion == 's':
+        return convert_str
+    if not flags and conversion in 'di':
+        return convert_int
+    spec = f'%{flags}{conversion}'
+    return lambda value: spec % (format_value(value),)
+
+
+class PrintTemplate():
+    """
+    The line a print statement prints, with the format string split into its literal
+    text and the conversions of its arguments once, before the program runs.
+
+    Print statements whose format string the template cannot split are rendered with
+    format_print_args instead, so they give the same output and errors as before.
+    """
+    def __init__(self, fmt, argc):
+        self.argc = argc  # the number of values printed, the format string included
+        self.text = None  # the whole line, if it does not depend on any value
+        self.literals = None
+        self.converters = None
+
+        if fmt is None:
+            return
+        if argc == 1:
+            self.text = fmt + '\n'
+            return
+        if UNSUPPORTED_FORMAT.search(fmt):
+            return
+
+        literals = []
+        converters = []
+        start = 0
+        literal = ''
+        for match in CONVERSION_PATTERN.finditer(fmt):
+            if '%' in fmt[start:match.start()]:
+                return
+            literal += fmt[start:match.start()]
+            start = match.end()
+            flags, conversion = match.groups()
+            if conversion == '%':
+                if flags:
+                    return
+                literal += '%'
+            else:
+                literals.append(literal)
+                converters.append(make_converter(flags, conversion))
+                literal = ''
+        if len(converters) != argc - 1 or '%' in fmt[start:]:
+            return
+        literals.append(literal + fmt[start:] + '\n')
+        self.literals = literals
+        self.converters = converters
+
+    def render(self, values):
+        """Returns the line printed for the values of the print statement's arguments."""
+        if self.text is not None:
+            return self.text
+        if self.converters is None:
+            return str(format_print_args(values)) + '\n'
+
+        literals = self.literals
+        parts = [literals[0]]
+        for i, convert in enumerate(self.converters, 1):
+            parts.append(convert(values[i]))
+            parts.append(literals[i])
+        return ''.join(parts)
+
+
+def make_template(args):
+    """Returns the PrintTemplate of a print statement with the given argument nodes."""
+    fmt = args[0].value if type(args[0]) == String else None
+    return PrintTemplate(fmt, len(args))
+
+
+class OutputBuffer():
+    """
+    Collects the output of scripts and writes it to sys.stdout in large pieces.
+
+    The buffer is flushed once it holds size characters, after every line when
+    sys.stdout is a terminal, whenever sys.stdout is replaced, and at exit.
+    """
+    def __init__(self, size=8192):
+        self.size = size
+        self.parts = []
+        self.length = 0
+        self.stream = None
+        self.line_buffered = False
+
+    def write(self, text):
+        stream = sys.stdout
+        if stream is not self.stream:
+            self.flush()
+            self.stream = stream
+            try:
+                self.line_buffered = stream.isatty()
+            except (AttributeError, ValueError):
+                self.line_buffered = False
+
+        self.parts.append(text)
+        self.length += len(text)
+        if self.length >= self.size or self.line_buffered:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.stream.write(''.join(self.parts))
+            self.parts = []
+            self.length = 0
+            self.stream.flush()
+
+
+writer = OutputBuffer()
+atexit.register(writer.flush)
@@ -0,0 +1,119 @@
+import json
+import sys
+from time import perf_counter
+
+
+class ProfileStats():
+    """The call count and times, in seconds, of one function or source line."""
+    def __init__(self, name, filename, line):
+        self.name = name
+        self.filename = filename
+        self.line = line
+        self.calls = 0
+        self.self_time = 0.0
+        self.cumulative_time = 0.0
+        self.active = 0  # number of unfinished calls, so recursion is not counted twice
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'file': self.filename,
+            'line': self.line,
+            'calls': self.calls,
+            'self_time': self.self_time,
+            'cumulative_time': self.cumulative_time,
+        }
+
+
+class Profiler():
+    """
+    Collects the time spent in each function and on each line of a script.
+
+    Self time excludes the time spent in the functions and lines that are entered
+    while a function or line runs; cumulative time includes it.
+    """
+    def __init__(self):
+        self.functions = {}  # FuncDecl -> ProfileStats
+        self.lines = {}  # (filename, line) -> ProfileStats
+        self.stack = []  # [stats, start time, time of nested entries]
+        self.filenames = []  # the file of the code being run
+
+    def attach(self, interpreter):
+        """Records the functions and lines run by a tree-walking interpreter, using its hooks."""
+        self.filenames.append(interpreter.parser.filename)
+        interpreter.add_hook('function_enter', self.enter_function)
+        interpreter.add_hook('function_exit', self.exit_function)
+        interpreter.add_hook('statement', self.enter_line)
+        interpreter.add_hook('statement_exit', self.exit_line)
+
+    def function_stats(self, decl):
+        stats = self.functions.get(decl)
+        if stats is None:
+            stats = self.functions[decl] = ProfileStats(decl.name, decl.filename, decl.line)
+        return stats
+
+    def line_stats(self, filename, line):
+        stats = self.lines.get((filename, line))
+        if stats is None:
+            stats = self.lines[filename, line] = ProfileStats(None, filename, line)
+        return stats
+
+    def enter_function(self, decl, args):
+        self.enter(self.function_stats(decl))
+        self.filenames.append(decl.filename)
+
+    def exit_function(self, decl, value):
+        self.filenames.pop()
+        self.exit()
+
+    def enter_line(self, node):
+        self.enter(self.line_stats(self.filenames[-1], node.line))
+
+    def exit_line(self, node):
+        self.exit()
+
+    def enter(self, stats):
+        stats.calls += 1
+        stats.active += 1
+        self.stack.append([stats, perf_counter(), 0.0])
+
+    def exit(self):
+        stats, start, nested = self.stack.pop()
+        elapsed = perf_counter() - start
+        stats.self_time += elapsed - nested
+        stats.active -= 1
+        if not stats.active:
+            stats.cumulative_time += elapsed
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+    def as_dict(self):
+        return {
+            'functions': [stats.as_dict() for stats in sort_stats(self.functions.values())],
+            'lines': [stats.as_dict() for stats in sort_stats(self.lines.values())],
+        }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def report(self, file=sys.stderr):
+        """Prints the functions and lines of the script, the slowest first."""
+        print('Functions:', file=file)
+        print_stats(sort_stats(self.functions.values()), file)
+        print('Lines:', file=file)
+        print_stats(sort_stats(self.lines.values()), file)
+
+
+def sort_stats(stats):
+    return sorted(stats, key=lambda s: (-s.self_time, -s.calls))
+
+
+def print_stats(stats, file):
+    print('%10s %12s %12s  %s' % ('calls', 'self (ms)', 'cumul (ms)', 'location'), file=file)
+    for s in stats:
+        location = f'{s.filename}:{s.line}'
+        if s.name is not None:
+            location = f'{s.name} ({location})'
+        print('%10d %12.3f %12.3f  %s' % (s.calls, 1000 * s.self_time, 1000 * s.cumulative_time, location),
+              file=file)
@@ -0,0 +1,172 @@
+from ast import FuncDecl
+from base_classes import NodeVisitor
+from symbol_table import FuncSymbol
+
+
+class FunctionInfo():
+    def __init__(self, decl):
+        self.decl = decl
+        self.callees = []  # declarations of the functions it calls
+        self.nested_callees = []  # (info, slot) of called functions declared in functions
+        self.nested = {}  # slot -> declaration of the functions declared inside it
+
+
+class PurityAnalyzer(NodeVisitor):
+    """
+    Marks every function declaration of a resolved program as pure or not.
+
+    A function is pure when it only reads its own parameters and variables, never
+    prints, runs embedded code, assigns to variables of other functions or the
+    program, or assigns into an array, and only calls pure functions. Calling a
+    pure function again with the same arguments always gives the same value.
+    """
+    def __init__(self, symtab):
+        self.symtab = symtab  # the analyzer's function symbols, including imported ones
+        self.functions = []
+        self.infos = []
+        self.global_functions = {}
+
+    def analyze(self, tree):
+        self.global_functions = {child.name: child for child in tree.children if type(child) == FuncDecl}
+        self.visit(tree)
+
+        # Nested functions may be called before their declaration is reached.
+        for info in self.infos:
+            for owner, slot in info.nested_callees:
+                callee = owner.nested.get(slot)
+                if callee is None:
+                    info.decl.pure = False
+                else:
+                    info.callees.append(callee)
+
+        # Calling an impure function makes a function impure; repeat until nothing changes.
+        changed = True
+        while changed:
+            changed = False
+            for info in self.infos:
+                if info.decl.pure and not all(callee.pure for callee in info.callees):
+                    info.decl.pure = False
+                    changed = True
+
+    def impure(self):
+        if len(self.functions) > 1:
+            self.functions[-1].decl.pure = False
+
+    def is_local(self, node):
+        return node.slot is not None and node.depth == 0
+
+    def visit_Arg(self, node):
+        self.visit(node.expr)
+
+    def visit_Array(self, node):
+        for expr in node.array:
+            self.visit(expr)
+
+    def visit_AssertStmt(self, node):
+        self.impure()
+        self.visit(node.condition)
+
+    def visit_Assign(self, node):
+        if node.index is not None or not self.is_local(node.left):
+            self.impure()
+        if node.index is not None:
+            self.visit(node.index)
+        self.visit(node.right)
+
+    def visit_BinOp(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_Block(self, node):
+        for child in node.stmt_list:
+            self.visit(child)
+
+    def visit_Code(self, node):
+        self.impure()
+
+    def visit_Compound(self, node):
+        # The program itself sits at the bottom of the stack to hold the functions it
+        # declares in nested blocks, but is never marked.
+        self.functions.append(FunctionInfo(None))
+        for child in node.children:
+            self.visit(child)
+        self.functions.pop()
+
+    def visit_ForStmt(self, node):
+        self.visit(node.init_stmt)
+        self.visit(node.condition)
+        self.visit(node.assign_stmt)
+        self.visit(node.block)
+
+    def visit_FuncCall(self, node):
+        if len(self.functions) > 1:
+            info = self.functions[-1]
+            if node.slot is not None:
+                info.nested_callees.append((self.functions[-1 - node.depth], node.slot))
+            elif node.name in self.global_functions:
+                info.callees.append(self.global_functions[node.name])
+            else:
+                # Imported functions are pure if the file declaring them found them pure.
+                symbol = self.symtab.lookup(node.name)
+                if type(symbol) != FuncSymbol or not symbol.pure:
+                    self.impure()
+        for arg in node.args:
+            self.visit(arg)
+
+    def visit_FuncDecl(self, node):
+        if node.slot is not None:
+            self.functions[-1].nested[node.slot] = node
+        node.pure = True
+
+        info = FunctionInfo(node)
+        self.infos.append(info)
+        self.functions.append(info)
+        self.visit(node.block_node)
+        self.functions.pop()
+
+    def visit_FuncLen(self, node):
+        self.visit(node.expr)
+
+    def visit_IfElse(self, node):
+        self.visit(node.condition)
+        self.visit(node.if_block)
+        if node.else_block:
+            self.visit(node.else_block)
+
+    def visit_ImportStmt(self, node):
+        self.impure()
+
+    def visit_Logical(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_Num(self, node):
+        pass
+
+    def visit_PrintStmt(self, node):
+        self.impure()
+
+    def visit_ReturnStmt(self, node):
+        self.visit(node.expr)
+
+    def visit_String(self, node):
+        pass
+
+    def visit_UnaryOp(self, node):
+        self.visit(node.expr)
+
+    def visit_Var(self, node):
+        if not self.is_local(node):
+            self.impure()
+        if node.index is not None:
+            self.visit(node.index)
+
+    def visit_VarDecl(self, node):
+        self.visit(node.right)
+
+    def visit_WhileStmt(self, node):
+        self.visit(node.cond)
+        self.visit(node.block)
@@ -0,0 +1,207 @@
+from ast import FuncCall, FuncDecl
+from base_classes import NodeVisitor
+from code_runner import compile_code
+from output import make_template
+from symbol_table import SymbolTable, VarSymbol
+
+
+class FrameLayout():
+    def __init__(self, name):
+        self.name = name
+        self.size = 0
+
+    def allocate(self):
+        self.size += 1
+        return self.size - 1
+
+
+class Resolver(NodeVisitor):
+    """
+    Assigns every local variable a (depth, slot) address.
+
+    Locals of a function, including those declared in nested blocks and loops, share
+    one fixed-size frame; depth counts how many function frames lie between a use and
+    its declaration. Names declared at the top level of the program, and names that do
+    not resolve to any local, are left unaddressed and are looked up as globals.
+    """
+    def __init__(self):
+        self.current_scope = None
+        self.frames = []
+        self.functions = []
+
+    def resolve(self, tree):
+        self.visit(tree)
+
+    def push_scope(self, scope_name):
+        self.current_scope = SymbolTable(
+            scope_name=scope_name,
+            scope_level=self.current_scope.scope_level + 1,
+            enclosing_scope=self.current_scope
+        )
+
+    def pop_scope(self):
+        self.current_scope = self.current_scope.enclosing_scope
+
+    def declare(self, name):
+        symbol = VarSymbol(name)
+        if self.current_scope.scope_level == 1:
+            symbol.slot = None
+        else:
+            symbol.slot = self.frames[-1].allocate()
+            symbol.frame_level = len(self.frames) - 1
+        self.current_scope.insert(symbol)
+        return symbol.slot
+
+    def address(self, name):
+        # Returns (depth, slot), or (None, None) for globals.
+        symbol = self.current_scope.lookup(name)
+        if symbol is None or symbol.slot is None:
+            return None, None
+        return len(self.frames) - 1 - symbol.frame_level, symbol.slot
+
+    def declare_functions(self, stmts):
+        # Function names are visible throughout the block they are declared in, so
+        # nested functions may call each other regardless of declaration order.
+        for stmt in stmts:
+            if type(stmt) == FuncDecl and self.current_scope.lookup(stmt.name, current_scope_only=True) is None:
+                stmt.slot = self.declare(stmt.name)
+
+    def visit_Arg(self, node):
+        self.visit(node.expr)
+
+    def visit_Array(self, node):
+        for expr in node.array:
+            self.visit(expr)
+
+    def visit_AssertStmt(self, node):
+        self.visit(node.condition)
+        self.visit(node.print_stmt)
+
+    def visit_Assign(self, node):
+        if node.index is not None:
+            self.visit(node.index)
+        self.visit(node.right)
+        self.visit(node.left)
+
+    def visit_BinOp(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_Block(self, node):
+        self.push_scope("block")
+        self.declare_functions(node.stmt_list)
+        for child in node.stmt_list:
+            self.visit(child)
+        self.pop_scope()
+
+    def visit_Code(self, node):
+        try:
+            node.code = compile_code(node)
+        except SyntaxError:
+            # Raised again if the code is ever run.
+            node.code = None
+
+    def visit_Compound(self, node):
+        self.current_scope = SymbolTable('global', 1)
+        self.frames.append(FrameLayout('<script>'))
+
+        for child in node.children:
+            self.visit(child)
+
+        node.frame_size = self.frames.pop().size
+        self.current_scope = None
+
+    def visit_ForStmt(self, node):
+        self.push_scope("for")
+        self.visit(node.init_stmt)
+        self.visit(node.condition)
+        self.visit(node.assign_stmt)
+        self.visit(node.block)
+        self.pop_scope()
+
+    def visit_FuncCall(self, node):
+        node.depth, node.slot = self.address(node.name)
+        for arg in node.args:
+            self.visit(arg)
+
+    def visit_FuncDecl(self, node):
+        if self.current_scope.lookup(node.name, current_scope_only=True) is None:
+            node.slot = self.declare(node.name)
+
+        # A nested function holds on to the frame of the function declaring it.
+        if self.functions:
+            self.functions[-1].encloses_functions = True
+        self.functions.append(node)
+
+        self.push_scope(node.name)
+        self.frames.append(FrameLayout(node.name))
+
+        # Parameters always occupy the first slots of the frame.
+        for param in node.params:
+            param.var_node.slot = self.declare(param.var_node.value)
+            param.var_node.depth = 0
+        self.visit(node.block_node)
+
+        node.frame_size = self.frames.pop().size
+        self.pop_scope()
+        self.functions.pop()
+
+    def visit_FuncLen(self, node):
+        self.visit(node.expr)
+
+    def visit_IfElse(self, node):
+        self.visit(node.condition)
+        self.push_scope("if")
+        self.visit(node.if_block)
+        self.pop_scope()
+        if node.else_block:
+            self.push_scope("else")
+            self.visit(node.else_block)
+            self.pop_scope()
+
+    def visit_ImportStmt(self, node):
+        pass
+
+    def visit_Logical(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_Num(self, node):
+        pass
+
+    def visit_PrintStmt(self, node):
+        node.template = make_template(node.args)
+        for arg in node.args:
+            self.visit(arg)
+
+    def visit_ReturnStmt(self, node):
+        # A call whose value is returned right away can replace the calling function.
+        node.tail_call = bool(self.functions) and type(node.expr) == FuncCall
+        if node.tail_call:
+            self.functions[-1].tail_calls = True
+        self.visit(node.expr)
+
+    def visit_String(self, node):
+        pass
+
+    def visit_UnaryOp(self, node):
+        self.visit(node.expr)
+
+    def visit_Var(self, node):
+        node.depth, node.slot = self.address(node.value)
+        if node.index is not None:
+            self.visit(node.index)
+
+    def visit_VarDecl(self, node):
+        self.visit(node.right)
+        node.left.slot = self.declare(node.left.value)
+        node.left.depth = None if node.left.slot is None else 0
+
+    def visit_WhileStmt(self, node):
+        self.push_scope("while")
+        self.visit(node.cond)
+        self.visit(node.block)
+        self.pop_scope()
@@ -0,0 +1,121 @@
+import threading
+from io import StringIO
+
+from cache import parse_source
+from closure_compiler import ClosureInterpreter
+from governor import GOVERNED_ENGINES
+from interpreter import Interpreter
+from symbol_table import SymbolTable, VarSymbol
+from vm import VM
+
+ENGINES = {
+    'tree': Interpreter,
+    'vm': VM,
+    'closure': ClosureInterpreter,
+}
+
+# Held while compiling, since imported files are loaded into the shared module registry.
+compile_lock = threading.Lock()
+
+
+class Result():
+    """What a run of a Program printed, and the values of its global variables afterwards."""
+    def __init__(self, output, variables):
+        self.output = output
+        self.variables = variables
+
+    def __getitem__(self, name):
+        return self.variables[name]
+
+
+class Program():
+    """
+    A program compiled by a Runtime.
+
+    Compiling scans, parses, analyzes and loads the imports of the source once.
+    The program can then be run any number of times, from any number of threads at
+    once: every run gets globals of its own and captures its own output.
+    """
+    def __init__(self, runtime, filename, code, imports, inputs):
+        self.runtime = runtime
+        self.filename = filename
+        self.code = code  # what the engine's analyze returned
+        self.imports = imports
+        self.inputs = inputs  # names of the variables given by the caller of run
+
+    def run(self, inputs=None):
+        """Runs the program with the given values of its inputs, returning a Result."""
+        interpreter, code = self.start(inputs)
+        interpreter.execute(code)
+        return self.result(interpreter)
+
+    def start(self, inputs=None):
+        """
+        Loads the program into an interpreter of its own, with the given values of its
+        inputs, returning the interpreter and the code for it to execute.
+        """
+        values = dict(inputs or {})
+        missing = [name for name in self.inputs if name not in values]
+        if missing:
+            raise ValueError(f"Missing inputs: {', '.join(missing)}.")
+        unknown = [name for name in values if name not in self.inputs]
+        if unknown:
+            raise ValueError(f"Unknown inputs: {', '.join(unknown)}.")
+
+        runtime = self.runtime
+        if runtime.limits:
+            interpreter = GOVERNED_ENGINES[runtime.engine](None, runtime.limits, runtime.optimize)
+        else:
+            interpreter = ENGINES[runtime.engine](None, runtime.optimize)
+        interpreter.output = StringIO()
+        code = interpreter.load(self.code, self.imports)
+        interpreter.global_scope.variables.update(values)
+        return interpreter, code
+
+    def result(self, interpreter):
+        """Returns the Result of a run by an interpreter given by start."""
+        return Result(interpreter.output.getvalue(), dict(interpreter.global_scope.variables))
+
+
+class Runtime():
+    """
+    Compiles Coizscript source into Programs for Python code embedding the language.
+
+        runtime = Runtime(engine='vm')
+        program = runtime.compile('print("%d", n * 2);', inputs=['n'])
+        program.run({'n': 21}).output  # '42\\n'
+
+    Runs of the programs of a Runtime given governor.Limits raise
+    governor.ResourceLimitError when they exceed them.
+    """
+    def __init__(self, engine='tree', optimize=0, limits=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}.")
+        if limits and engine not in GOVERNED_ENGINES:
+            raise ValueError(f"The {engine} engine cannot enforce limits.")
+        self.engine = engine
+        self.optimize = optimize
+        self.limits = limits
+
+    def compile(self, source, filename='<script>', inputs=()):
+        """
+        Compiles source into a Program. inputs are the names of global variables the
+        program may use without declaring them, whose values are given to each run.
+
+        Raises SyntaxError if the source cannot be parsed, after printing the errors.
+        """
+        inputs = tuple(inputs)
+        with compile_lock:
+            parser = parse_source(source, filename)
+            if parser is None or parser.has_error:
+                raise SyntaxError(f"{filename} has syntax errors.")
+
+            interpreter = ENGINES[self.engine](parser, self.optimize)
+            # The symbols of the inputs enclose the program's global symbol table.
+            input_scope = SymbolTable('inputs', 0)
+            for name in inputs:
+                input_scope.insert(VarSymbol(name, 'any'))
+            interpreter.symantic_analyzer.current_scope = input_scope
+
+            code = interpreter.analyze()
+            return Program(self, filename, code, list(interpreter.symantic_analyzer.imports), inputs)
@@ -0,0 +1,145 @@
+import types
+from collections import deque
+from time import perf_counter
+
+from latency import latency_stats
+from vm import SUSPENDED
+
+# Number of recent slices and waits the latency statistics are computed over.
+LATENCY_WINDOW = 10000
+
+
+@types.coroutine
+def switch():
+    """Gives control back to the event loop for one round, like asyncio.sleep(0)."""
+    yield
+
+
+class TaskStats():
+    """How one program run by a Scheduler shared the event loop."""
+    def __init__(self, name):
+        self.name = name
+        self.finished = False
+        self.slices = 0
+        self.run_time = 0.0  # time spent running, summed over the slices
+        self.wait_time = 0.0  # time spent waiting for the event loop to resume it
+        self.max_slice = 0.0
+        self.max_wait = 0.0
+
+    def mean_slice(self):
+        return self.run_time / self.slices if self.slices else 0.0
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'finished': self.finished,
+            'slices': self.slices,
+            'run_time': self.run_time,
+            'wait_time': self.wait_time,
+            'max_slice': self.max_slice,
+            'max_wait': self.max_wait,
+            'mean_slice': self.mean_slice(),
+        }
+
+
+class Scheduler():
+    """
+    Runs programs compiled for the vm engine as coroutines, so many of them can share
+    one event loop without a thread each.
+
+    A program runs in slices: after budget loop iterations and function calls, it
+    gives control back to the event loop, which resumes every other ready coroutine
+    before resuming it again. The coroutines switch the way asyncio.sleep(0) does, so
+    they can be awaited in asyncio tasks, or driven by run_all.
+
+        scheduler = Scheduler(budget=1000)
+        result = await scheduler.run(program, {'n': 10})
+    """
+    def __init__(self, budget=1000):
+        if budget < 1:
+            raise ValueError("The budget must be at least 1.")
+        self.budget = budget
+        self.tasks = []
+        self.slices = deque(maxlen=LATENCY_WINDOW)
+        self.waits = deque(maxlen=LATENCY_WINDOW)
+
+    async def run(self, program, inputs=None, name=None):
+        """Runs program with the given values of its inputs, returning a Result."""
+        if program.runtime.engine != 'vm':
+            raise ValueError("The scheduler runs programs compiled for the vm engine.")
+        if program.runtime.limits:
+            raise ValueError("The scheduler cannot run programs under limits.")
+        interpreter, code = program.start(inputs)
+        task = TaskStats(name or program.filename)
+        self.tasks.append(task)
+
+        start = perf_counter()
+        running = True  # False while waiting, when there is no slice to record
+        try:
+            value = interpreter.execute(code, self.budget)
+            while value is SUSPENDED:
+                self.record_slice(task, perf_counter() - start)
+                running = False
+                paused = perf_counter()
+                await switch()
+                start = perf_counter()
+                running = True
+                self.record_wait(task, start - paused)
+                value = interpreter.resume(self.budget)
+        finally:
+            if running:
+                self.record_slice(task, perf_counter() - start)
+            task.finished = True
+        return program.result(interpreter)
+
+    def record_slice(self, task, elapsed):
+        task.slices += 1
+        task.run_time += elapsed
+        task.max_slice = max(task.max_slice, elapsed)
+        self.slices.append(elapsed)
+
+    def record_wait(self, task, elapsed):
+        task.wait_time += elapsed
+        task.max_wait = max(task.max_wait, elapsed)
+        self.waits.append(elapsed)
+
+    def fairness(self):
+        """
+        Returns Jain's fairness index of how long every program held the loop per
+        slice: 1.0 when they all held it equally long, down to 1/n when a single one
+        of n programs held it for all but a negligible part.
+        """
+        means = [task.mean_slice() for task in self.tasks]
+        if not any(means):
+            return 1.0
+        return sum(means) ** 2 / (len(means) * sum(mean * mean for mean in means))
+
+    def stats(self):
+        """Returns the scheduler's fairness and latency statistics as a dict."""
+        return {
+            'budget': self.budget,
+            'tasks': len(self.tasks),
+            'finished': sum(1 for task in self.tasks if task.finished),
+            'slices': sum(task.slices for task in self.tasks),
+            'fairness': self.fairness(),
+            'slice': latency_stats(self.slices),  # how long a program held the loop
+            'wait': latency_stats(self.waits),  # how long a suspended program waited to resume
+        }
+
+
+def run_all(coroutines):
+    """
+    Runs coroutines to completion without an event loop, resuming them in turn
+    every time one of them switches, and returns their results in order.
+    """
+    results = [None] * len(coroutines)
+    ready = deque(enumerate(coroutines))
+    while ready:
+        i, coroutine = ready.popleft()
+        try:
+            coroutine.send(None)
+        except StopIteration as stop:
+            results[i] = stop.value
+        else:
+            ready.append((i, coroutine))
+    return results
@@ -0,0 +1,318 @@
+import contextlib
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict, deque
+from io import StringIO
+
+import modules
+from governor import Limits, ResourceLimitError
+from latency import latency_stats
+from runtime import Runtime
+
+# Number of compiled programs each worker keeps, so resubmitted scripts are not compiled again.
+PROGRAM_CACHE_SIZE = 64
+# Number of recent jobs the latency statistics are computed over.
+LATENCY_WINDOW = 1000
+
+programs = OrderedDict()
+
+
+def compile_program(engine, optimize, limits, source, filename, inputs):
+    key = (engine, optimize, tuple(sorted(limits.items())), source, filename, inputs)
+    program = programs.get(key)
+    if program is None:
+        runtime = Runtime(engine, optimize, Limits(**limits))
+        program = programs[key] = runtime.compile(source, filename, inputs)
+        if len(programs) > PROGRAM_CACHE_SIZE:
+            programs.popitem(last=False)
+    else:
+        programs.move_to_end(key)
+    return program
+
+
+def run_job(job):
+    """Runs a job in a worker process, returning its response."""
+    start = time.perf_counter()
+    messages = StringIO()
+    response = {'ok': True, 'output': '', 'error': None, 'worker': os.getpid()}
+    try:
+        inputs = job.get('inputs') or {}
+        # Scanning and parsing errors are printed, so they are captured as well.
+        with contextlib.redirect_stdout(messages):
+            program = compile_program(job['engine'], job['optimize'], job.get('limits') or {}, job['source'],
+                                      job.get('filename', '<job>'), tuple(sorted(inputs)))
+            response['output'] = program.run(inputs).output
+    except ResourceLimitError as e:
+        response['ok'] = False
+        response['error'] = f'{type(e).__name__}: {e}\n'
+        response['limit'] = e.as_dict()
+    except Exception as e:
+        response['ok'] = False
+        response['error'] = messages.getvalue() + f'{type(e).__name__}: {e}\n'
+    response['run_time'] = time.perf_counter() - start
+    return response
+
+
+def send(stream, message):
+    stream.write(json.dumps(message).encode('utf-8') + b'\n')
+    stream.flush()
+
+
+def receive(stream):
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("The connection was closed.")
+    return json.loads(line)
+
+
+class Worker():
+    """A forked worker process, running the jobs the server sends it one at a time."""
+    def __init__(self, pool):
+        parent_socket, child_socket = socket.socketpair()
+        self.pid = os.fork()
+        if self.pid == 0:
+            parent_socket.close()
+            pool.close_in_child()
+            self.serve(child_socket.makefile('rwb'))
+        child_socket.close()
+        self.socket = parent_socket
+        self.stream = parent_socket.makefile('rwb')
+
+    def serve(self, stream):
+        # The server shuts its workers down by closing their sockets.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        status = 0
+        try:
+            while True:
+                line = stream.readline()
+                if not line:
+                    break
+                send(stream, run_job(json.loads(line)))
+        except BaseException:
+            status = 1
+        finally:
+            # Leave without running the exit handlers of the server process.
+            os._exit(status)
+
+    def run(self, job):
+        send(self.stream, job)
+        return receive(self.stream)
+
+    def close(self):
+        self.stream.close()
+        self.socket.close()
+        os.waitpid(self.pid, 0)
+
+
+class WorkerPool():
+    """
+    Worker processes forked from the server, and a queue of the idle ones.
+
+    A job waits in the queue until a worker is free, so at most one job runs per
+    worker. A worker that dies while running a job is replaced by the pool's spawner
+    thread, so the threads handling jobs never fork.
+    """
+    def __init__(self, size, listener=None):
+        self.size = size
+        self.workers = []
+        self.idle = queue.Queue()
+        self.dead = queue.Queue()  # workers to replace, then None to stop the spawner
+        self.listener = listener
+        for _ in range(size):
+            self.add_worker()
+        self.spawner = threading.Thread(target=self.replace_workers, name='spawner', daemon=True)
+        self.spawner.start()
+
+    def add_worker(self):
+        worker = Worker(self)
+        self.workers.append(worker)
+        self.idle.put(worker)
+
+    def close_in_child(self):
+        # A worker keeps none of the server's sockets open, so closing them reaches the other workers.
+        for worker in self.workers:
+            worker.stream.close()
+            worker.socket.close()
+        if self.listener is not None:
+            self.listener.close()
+
+    def replace_workers(self):
+        while True:
+            worker = self.dead.get()
+            if worker is None:
+                break
+            self.workers.remove(worker)
+            worker.close()
+            self.add_worker()
+
+    def run(self, job):
+        worker = self.idle.get()
+        try:
+            response = worker.run(job)
+        except (ConnectionError, OSError, ValueError):
+            self.dead.put(worker)
+            return {'ok': False, 'output': '', 'error': 'The worker running the job died.\n', 'worker': worker.pid}
+        self.idle.put(worker)
+        return response
+
+    def close(self):
+        self.dead.put(None)
+        self.spawner.join()
+        for worker in self.workers:
+            worker.close()
+        self.workers = []
+
+
+class ServerStats():
+    """Throughput and latency of the jobs a server has run."""
+    def __init__(self, workers):
+        self.workers = workers
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def submitted(self):
+        with self.lock:
+            self.pending += 1
+
+    def finished(self, ok, latency):
+        with self.lock:
+            self.pending -= 1
+            self.completed += 1
+            if not ok:
+                self.failed += 1
+            self.latencies.append(latency)
+
+    def as_dict(self):
+        with self.lock:
+            uptime = time.monotonic() - self.started
+            latencies = list(self.latencies)
+            stats = {
+                'workers': self.workers,
+                'uptime': uptime,
+                'pending': self.pending,
+                'completed': self.completed,
+                'failed': self.failed,
+                'throughput': self.completed / uptime if uptime else 0.0,
+            }
+        if latencies:
+            stats['latency'] = latency_stats(latencies)
+        return stats
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """Answers each line of JSON sent over a connection with a line of JSON."""
+    def handle(self):
+        server = self.server
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {'ok': False, 'error': f'Invalid request: {e}'}
+            else:
+                if request.get('command') == 'stats':
+                    response = server.stats.as_dict()
+                else:
+                    response = server.submit(request)
+            send(self.wfile, response)
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Runs scripts sent over a Unix socket in a pool of worker processes.
+
+    The libraries to preload are imported and analyzed before the workers are
+    forked, so every worker starts warm and shares their memory copy-on-write.
+    Each connection is served by a thread of its own that queues its jobs on the
+    pool, so jobs from all connections run across every worker.
+
+    A request is a line of JSON: {"source": ..., "filename": ..., "inputs": {...},
+    "engine": ..., "optimize": ...}, where all but source are optional, or
+    {"command": "stats"}. The response is a line of JSON holding the job's output,
+    or the server's statistics. Every job runs under the server's limits, if any.
+    The socket is only accessible to the user running the server.
+    """
+    daemon_threads = True
+
+    def __init__(self, path, workers=None, preload=(), engine='tree', optimize=0, limits=None):
+        for name in preload:
+            module = modules.registry.load(name)
+            # Bind the declarations of a lazily imported module now, rather than once in every worker.
+            if module.namespace is not None:
+                for decl_name in list(module.namespace.decls):
+                    module.namespace.bind(decl_name)
+
+        self.path = path
+        self.engine = engine
+        self.optimize = optimize
+        self.limits = limits  # the Limits every job runs under
+        self.pool = WorkerPool(workers or os.cpu_count() or 1)
+        self.stats = ServerStats(self.pool.size)
+        if os.path.exists(path):
+            os.unlink(path)
+        # Jobs can run embedded Python, so only the user running the server may connect.
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, JobHandler)
+        finally:
+            os.umask(umask)
+        self.pool.listener = self.socket
+
+    def submit(self, request):
+        if type(request.get('source')) != str:
+            return {'ok': False, 'error': 'Invalid request: no source.'}
+        engine = request.get('engine')
+        optimize = request.get('optimize')
+        job = {
+            'source': request['source'],
+            'filename': request.get('filename', '<job>'),
+            'inputs': request.get('inputs'),
+            'engine': self.engine if engine is None else engine,
+            'optimize': self.optimize if optimize is None else optimize,
+        }
+        if self.limits:
+            job['limits'] = vars(self.limits)
+        start = time.perf_counter()
+        self.stats.submitted()
+        response = self.pool.run(job)
+        response['latency'] = time.perf_counter() - start
+        self.stats.finished(response['ok'], response['latency'])
+        return response
+
+    def server_close(self):
+        super().server_close()
+        self.pool.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class Client():
+    """Sends jobs to a Server over its Unix socket."""
+    def __init__(self, path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.file = self.socket.makefile('rwb')
+
+    def request(self, request):
+        send(self.file, request)
+        return receive(self.file)
+
+    def run(self, source, filename='<job>', inputs=None, **options):
+        """Runs source on the server, returning the response."""
+        return self.request(dict(options, source=source, filename=filename, inputs=inputs))
+
+    def stats(self):
+        return self.request({'command': 'stats'})
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
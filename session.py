@@ -0,0 +1,52 @@
+from cache import parse_source
+from governor import GOVERNED_ENGINES
+import output
+from runtime import ENGINES
+from symbol_table import SymbolTable
+
+
+class Session():
+    """
+    An interactive session, running every input it is given in the same globals.
+
+    One interpreter serves the whole session. Each input is analyzed on its own,
+    against the symbols of everything entered before it, so the cost of an input
+    does not grow with the length of the session. A module imported earlier in the
+    session is neither loaded nor exported again.
+
+    A name declared again replaces the earlier declaration, as it would in a new
+    script, rather than being an error.
+    """
+    def __init__(self, engine='tree', optimize=0, limits=None, filename=''):
+        if limits:
+            self.interpreter = GOVERNED_ENGINES[engine](None, limits, optimize)
+        else:
+            self.interpreter = ENGINES[engine](None, optimize)
+        self.filename = filename
+        self.symbols = SymbolTable('session', 0)  # the symbols of every input run so far
+
+    def run(self, source):
+        """Runs source in the session. Returns True, running none of it, if it has syntax errors."""
+        parser = parse_source(source, self.filename)
+        if parser is None or parser.has_error:
+            return True
+
+        interpreter = self.interpreter
+        analyzer = interpreter.symantic_analyzer
+        interpreter.parser = parser
+        analyzer.current_scope = self.symbols
+        imported = len(analyzer.imports)
+        try:
+            code = interpreter.analyze()
+        except BaseException:
+            # Forget the modules of an input that failed, so a later import exports them.
+            del analyzer.imports[imported:]
+            raise
+        self.symbols.import_symbols(analyzer.global_scope)
+
+        code = interpreter.load(code, analyzer.imports[imported:])
+        try:
+            interpreter.execute(code)
+        finally:
+            output.writer.flush()
+        return False
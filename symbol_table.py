@@ -14,6 +14,7 @@ class FuncSymbol(Symbol):
         super(FuncSymbol, self).__init__(name)
         # a list of formal parameters
         self.params = params if params is not None else []
+        self.pure = False
 
     def __str__(self):
         return '<{class_name}(name={name}, parameters={params})>'.format(
@@ -76,6 +77,9 @@ class SymbolTable():
             print('Insert: %s' % symbol.name)
         self._symbols[symbol.name] = symbol
 
+    def import_symbols(self, table):
+        self._symbols.update(table._symbols)
+
     def lookup(self, name, current_scope_only=False):
         if self.debug:
             print('Lookup: %s. (Scope name: %s)' % (name, self.scope_name))
@@ -97,6 +101,7 @@ class SemanticAnalyzer(NodeVisitor):
     def __init__(self):
         self.symtab = SymbolTable('global', 1)
         self.current_scope = None
+        self.global_scope = None  # the symbols declared at the top level of the last program visited
         self.imports = []
 
     def visit_Array(self, node):
@@ -115,7 +120,7 @@ class SemanticAnalyzer(NodeVisitor):
             raise NameError(repr(var_name))
 
         if node.index:
-            if var_symbol.type != 'array':
+            if var_symbol.type not in ('array', 'any'):
                 raise TypeError("Variable %s is not indexed." % var_name)
 
         self.visit(node.right)
@@ -193,26 +198,18 @@ class SemanticAnalyzer(NodeVisitor):
 
     def visit_ImportStmt(self, node):
         try:
-            with open(f'{node.filename.value}.coiz', 'r') as f:
-                source = f.read()
-            from scanner import Scanner
-            from token_parser import Parser
-            from interpreter import Interpreter
-            scanner = Scanner(source, node.filename.value)
-            scanner.scan_tokens()
-
-            parser = Parser(scanner)
-            interpreter = Interpreter(parser)
-            interpreter.interpret()
-
-            for var_name, data in interpreter.current_scope.variables.items():
-                if type(data) == FuncDecl:
-                    self.symtab.insert(FuncSymbol(var_name, data.params))
+            from modules import registry
+            module = registry.load(node.filename.value)
+            if module.scope is None:
+                return
+
+            for symbol in module.symbols:
+                if type(symbol) == FuncSymbol:
+                    self.symtab.insert(symbol)
                 else:
-                    self.current_scope.insert(VarSymbol(var_name))
-            # for func_name, func_decl in interpreter.callables.items():
-            #     self.symtab.insert(FuncSymbol(func_name, func_decl.params))
-            self.imports.append(interpreter)
+                    self.current_scope.insert(symbol)
+            if module not in self.imports:
+                self.imports.append(module)
         except Exception as e:
             print(e)
 
@@ -236,6 +233,7 @@ class SemanticAnalyzer(NodeVisitor):
             enclosing_scope=self.current_scope,  # None
         )
         self.current_scope = global_scope
+        self.global_scope = global_scope
         for child in node.children:
             self.visit(child)
         self.current_scope = self.current_scope.enclosing_scope
@@ -254,7 +252,7 @@ class SemanticAnalyzer(NodeVisitor):
         if var_symbol is None:
             raise NameError(repr(var_name))
 
-        if node.index is not None and var_symbol.type is None:
+        if node.index is not None and var_symbol.type not in ('array', 'string', 'any'):
             raise TypeError("Variable %s is not indexed." % var_name)
 
     def visit_VarDecl(self, node):
@@ -265,6 +263,9 @@ class SemanticAnalyzer(NodeVisitor):
             var_type = "array"
         elif type(node.right) == String:
             var_type = "string"
+        elif type(node.right) == FuncCall:
+            # Functions may return arrays or vectors, so the value might be indexed.
+            var_type = "any"
         else:
             var_type = None
         var_symbol = VarSymbol(var_name, var_type)
@@ -4,10 +4,12 @@ from token import TokenType
 
 class Parser():
     def __init__(self, scanner):
-        self.tokens = scanner.tokens
+        # Tokens are pulled from the scanner as they are needed unless it has already
+        # scanned the whole source.
+        self.tokens = iter(scanner.tokens if scanner.tokens else scanner.iter_tokens())
         self.filename = scanner.filename
-        self.current_token_index = 0
-        self.current_token = self.tokens[0]
+        self.current_token = next(self.tokens)
+        self.tree = None
         self.has_error = False
 
     def print_error(self, line, message):
@@ -23,17 +25,19 @@ class Parser():
             self.print_error(self.current_token.line, f"Expected token {TokenType(token_type).name}")
 
     def get_next_token(self):
-        self.current_token_index += 1
         try:
-            self.current_token = self.tokens[self.current_token_index]
-        except IndexError:
-            self.print_error(self.tokens[self.current_token_index - 1].line, "Run out of tokens for expr.")
+            self.current_token = next(self.tokens)
+        except StopIteration:
+            self.print_error(self.current_token.line, "Run out of tokens for expr.")
 
     def parse(self):
+        if self.tree is not None:
+            return self.tree
         node = self.program()
         if self.current_token.type != TokenType.EOF:
             print(self.current_token)
             self.print_error(self.current_token.line, "Finished parsing before EOF.")
+        self.tree = node
         return node
 
     def arg(self):
@@ -194,6 +198,7 @@ class Parser():
         """
         func_decl : FUNC identifier ( params_list* ) { statement_list }
         """
+        line = self.current_token.line
         self.eat(TokenType.FUNC)
         func_name = self.current_token.lexeme
         self.eat(TokenType.IDENTIFIER)
@@ -205,6 +210,8 @@ class Parser():
         self.eat(TokenType.RIGHT_PAREN)
         root = self.block()
         node = FuncDecl(func_name, params, root)
+        node.line = line
+        node.filename = self.filename
         return node
 
     def func_len(self):
@@ -228,6 +235,7 @@ class Parser():
         """
         ifelse : if ( condition ) block (else ifelse | else block)*
         """
+        line = self.current_token.line
         self.eat(TokenType.IF)
         self.eat(TokenType.LEFT_PAREN)
 
@@ -247,6 +255,7 @@ class Parser():
         else:
             node = IfElse(condition, if_block, None)
 
+        node.line = line
         return node
 
     def logic_and(self):
@@ -381,6 +390,7 @@ class Parser():
                   | empty
         """
         token = self.current_token
+        line = token.line
         if token.type == TokenType.VAR:
             node = self.initialization_statement()
         elif token.type == TokenType.IDENTIFIER:
@@ -399,6 +409,7 @@ class Parser():
             node = self.import_statement()
         else:
             node = self.empty()
+        node.line = line
         return node
 
     def assert_statement(self):
@@ -0,0 +1,174 @@
+import math
+import operator
+from array import array
+from itertools import repeat
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def make_data(values):
+    """Returns values as the contiguous float storage used by vectors."""
+    if numpy is not None:
+        return numpy.array(values, dtype=float)
+    return array('d', values)
+
+
+def operand(value, length):
+    # Returns the storage of a vector or array operand, or the number itself.
+    if type(value) == Vector:
+        data = value.data
+    elif type(value) == list:
+        data = make_data(value)
+    else:
+        return value
+    if len(data) != length:
+        raise ValueError(f"Vectors have different lengths ({length} and {len(data)}).")
+    return data
+
+
+class Vector():
+    """
+    A vector of floats stored in contiguous memory.
+
+    Arithmetic and comparison operators work element-wise, with numbers applied to
+    every element. Comparisons give vectors of 1s and 0s. The storage is a NumPy
+    array when NumPy is installed and an array('d') otherwise.
+    """
+    def __init__(self, data):
+        self.data = data
+
+    def elementwise(self, op, other, reflected=False):
+        data = self.data
+        other = operand(other, len(data))
+        left, right = (other, data) if reflected else (data, other)
+        if numpy is not None:
+            return Vector(numpy.asarray(op(left, right), dtype=float))
+        if type(left) != array:
+            left = repeat(left)
+        if type(right) != array:
+            right = repeat(right)
+        return Vector(array('d', map(op, left, right)))
+
+    def __add__(self, other):
+        return self.elementwise(operator.add, other)
+
+    def __radd__(self, other):
+        return self.elementwise(operator.add, other, True)
+
+    def __sub__(self, other):
+        return self.elementwise(operator.sub, other)
+
+    def __rsub__(self, other):
+        return self.elementwise(operator.sub, other, True)
+
+    def __mul__(self, other):
+        return self.elementwise(operator.mul, other)
+
+    def __rmul__(self, other):
+        return self.elementwise(operator.mul, other, True)
+
+    def __truediv__(self, other):
+        return self.elementwise(operator.truediv, other)
+
+    def __rtruediv__(self, other):
+        return self.elementwise(operator.truediv, other, True)
+
+    def __mod__(self, other):
+        return self.elementwise(operator.mod, other)
+
+    def __rmod__(self, other):
+        return self.elementwise(operator.mod, other, True)
+
+    def __eq__(self, other):
+        return self.elementwise(operator.eq, other)
+
+    def __ne__(self, other):
+        return self.elementwise(operator.ne, other)
+
+    def __lt__(self, other):
+        return self.elementwise(operator.lt, other)
+
+    def __le__(self, other):
+        return self.elementwise(operator.le, other)
+
+    def __gt__(self, other):
+        return self.elementwise(operator.gt, other)
+
+    def __ge__(self, other):
+        return self.elementwise(operator.ge, other)
+
+    def __neg__(self):
+        return Vector(make_data(-e for e in self.data) if numpy is None else -self.data)
+
+    def __pos__(self):
+        return Vector(make_data(self.data))
+
+    def __bool__(self):
+        raise TypeError("The truth value of a vector is ambiguous.")
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, i):
+        return float(self.data[i])
+
+    def __setitem__(self, i, value):
+        self.data[i] = value
+
+    def __iter__(self):
+        return (float(e) for e in self.data)
+
+    def __str__(self):
+        return '[{}]'.format(', '.join(str(int(e)) if e.is_integer() else str(e) for e in self))
+
+    __repr__ = __str__
+
+    __hash__ = None
+
+
+def vector_zeros(count):
+    if numpy is not None:
+        return Vector(numpy.zeros(int(count)))
+    return Vector(array('d', bytes(8 * int(count))))
+
+
+def vector_range(start, stop, step):
+    if step == 0:
+        raise ValueError("The step of a range cannot be 0.")
+    count = max(0, math.ceil((stop - start) / step))
+    if numpy is not None:
+        return Vector(start + numpy.arange(count, dtype=float) * step)
+    return Vector(array('d', (start + i * step for i in range(count))))
+
+
+def vector_sum(values):
+    if type(values) == Vector and numpy is not None:
+        return float(values.data.sum())
+    total = 0.0
+    for e in values:
+        total += e
+    return total
+
+
+def vector_min(values):
+    if type(values) == Vector:
+        values = values.data
+    return float(min(values))
+
+
+def vector_max(values):
+    if type(values) == Vector:
+        values = values.data
+    return float(max(values))
+
+
+def vector_dot(left, right):
+    if type(left) != Vector:
+        left = Vector(make_data(left))
+    right = operand(right, len(left))
+    if numpy is not None:
+        return float(numpy.dot(left.data, right))
+    return vector_sum(map(operator.mul, left.data, right))
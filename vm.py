@@ -0,0 +1,438 @@
+from analysis import analyze
+from bytecode import Chunk, Function, OpCode
+from compiler import Compiler
+from code_runner import CodeRunner
+from interpreter import Frame, FramePool, Scope
+import memo
+from native import NativeFunction
+from optimizer import Optimizer
+from output import writer
+from resolver import Resolver
+from symbol_table import SemanticAnalyzer
+from vector import Vector
+
+# Returned by run when the budget of a run runs out before the script finishes.
+SUSPENDED = object()
+
+
+class VM():
+    """Stack-based virtual machine executing bytecode produced by the Compiler."""
+    def __init__(self, parser, optimize=0):
+        self.parser = parser
+        self.symantic_analyzer = SemanticAnalyzer()
+        self.optimizer = Optimizer(optimize)
+        self.resolver = Resolver()
+        self.compiler = Compiler()
+        self.global_scope = Scope("global", 1, None)
+        self.code_runner = CodeRunner()
+        self.output = writer  # where printed lines are written
+        self.frame = None
+        self.frame_pools = {}
+        self.suspended = None  # where a run that ran out of budget stopped
+
+    def interpret(self):
+        return self.execute(self.prepare())
+
+    def prepare(self):
+        """Runs every pass over the program and compiles it, returning the script to run."""
+        return self.load(self.analyze(), self.symantic_analyzer.imports)
+
+    def analyze(self):
+        """
+        Runs every pass over the program and compiles it, returning the script as a
+        Function. The script can be loaded by any number of VMs.
+        """
+        tree = analyze(self)
+        chunk = self.compiler.compile(tree, self.parser.filename)
+        return Function(self.parser.filename, [], chunk, tree.frame_size)
+
+    def load(self, script, imports):
+        """Sets up the globals of a compiled script and the modules it imports, returning the script."""
+        # Import variables and functions from imported files.
+        for module in imports:
+            module.export_to(self.global_scope, self.import_value)
+
+        self.frame = Frame(script.frame_size, None)
+        return script
+
+    def import_value(self, data):
+        # Memoized functions of imported files are compiled and memoized again, to run on this VM.
+        if type(data) == NativeFunction and data.memoized is not None:
+            function = self.compiler.import_value(data.memoized)
+            return memo.memoize(data.name, data.params, lambda args: self.call_function(function, args), function)
+        return self.compiler.import_value(data)
+
+    def execute(self, script, budget=0):
+        return self.run(script.chunk, self.frame, budget)
+
+    def resume(self, budget=0):
+        """Continues a run that returned SUSPENDED."""
+        state, self.suspended = self.suspended, None
+        return self.run_from(*state, budget)
+
+    def call_function(self, function, args):
+        """Calls function with args from Python and returns its value."""
+        return self.run(self.call_chunk(function, args), Frame(0, None))
+
+    def call_chunk(self, function, args):
+        """Returns a chunk calling function with args."""
+        chunk = Chunk(function.name)
+        chunk.emit(OpCode.CONSTANT, None, chunk.add_constant(function))
+        for arg in args:
+            chunk.emit(OpCode.CONSTANT, None, chunk.add_constant(arg))
+        chunk.emit(OpCode.CALL, None, len(args))
+        chunk.emit(OpCode.HALT, None)
+        return chunk
+
+    def check_size(self, value, code, ip):
+        """Called with each array or string built by a checked op at ip in code; see Compiler.check_sizes."""
+
+    def run(self, chunk, frame, budget=0):
+        """
+        Runs chunk in frame. If budget is given, the run is suspended once that many
+        loop iterations and calls have been made, and returns SUSPENDED; resume
+        continues it.
+        """
+        return self.run_from(chunk.code, chunk.constants, 0, frame, [], [], budget)
+
+    def run_from(self, code, constants, ip, frame, frames, stack, budget):
+        slots = frame.slots
+        variables = self.global_scope.variables
+        push = stack.append
+        pop = stack.pop
+        # Counted down at every backward jump and call; a run without a budget never reaches zero.
+        steps = budget or -1
+
+        frame_pools = self.frame_pools
+
+        CONSTANT = OpCode.CONSTANT
+        ARRAY = OpCode.ARRAY
+        CODE = OpCode.CODE
+        FUNC = OpCode.FUNC
+        MEMO_FUNC = OpCode.MEMO_FUNC
+        LOAD_LOCAL = OpCode.LOAD_LOCAL
+        LOAD_OUTER = OpCode.LOAD_OUTER
+        LOAD_GLOBAL = OpCode.LOAD_GLOBAL
+        STORE_LOCAL = OpCode.STORE_LOCAL
+        STORE_OUTER = OpCode.STORE_OUTER
+        STORE_GLOBAL = OpCode.STORE_GLOBAL
+        DEFINE_GLOBAL = OpCode.DEFINE_GLOBAL
+        INDEX = OpCode.INDEX
+        SET_INDEX = OpCode.SET_INDEX
+        ADD = OpCode.ADD
+        SUBTRACT = OpCode.SUBTRACT
+        MULTIPLY = OpCode.MULTIPLY
+        DIVIDE = OpCode.DIVIDE
+        MODULO = OpCode.MODULO
+        NEGATE = OpCode.NEGATE
+        POSITIVE = OpCode.POSITIVE
+        CHECKED_ADD = OpCode.CHECKED_ADD
+        CHECKED_MULTIPLY = OpCode.CHECKED_MULTIPLY
+        EQUAL = OpCode.EQUAL
+        NOT_EQUAL = OpCode.NOT_EQUAL
+        GREATER = OpCode.GREATER
+        GREATER_EQUAL = OpCode.GREATER_EQUAL
+        LESS = OpCode.LESS
+        LESS_EQUAL = OpCode.LESS_EQUAL
+        JUMP = OpCode.JUMP
+        JUMP_IF_FALSE = OpCode.JUMP_IF_FALSE
+        JUMP_IF_TRUE = OpCode.JUMP_IF_TRUE
+        JUMP_IF_FALSE_OR_POP = OpCode.JUMP_IF_FALSE_OR_POP
+        JUMP_IF_TRUE_OR_POP = OpCode.JUMP_IF_TRUE_OR_POP
+        CALL = OpCode.CALL
+        TAIL_CALL = OpCode.TAIL_CALL
+        RETURN = OpCode.RETURN
+        HALT = OpCode.HALT
+        LEN = OpCode.LEN
+        PRINT = OpCode.PRINT
+        POP = OpCode.POP
+        DUP = OpCode.DUP
+        DUP_TWO = OpCode.DUP_TWO
+
+        # The most frequently run opcodes are tested first.
+        while True:
+            op = code[ip]
+
+            if op == LOAD_LOCAL:
+                val = slots[code[ip + 2]]
+                if val is None:
+                    raise NameError(repr(constants[code[ip + 1]]))
+                push(val)
+                ip += 3
+            elif op == CONSTANT:
+                push(constants[code[ip + 1]])
+                ip += 2
+            elif op == JUMP_IF_FALSE:
+                if pop():
+                    ip += 2
+                else:
+                    ip = code[ip + 1]
+            elif op == ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+                ip += 1
+            elif op == STORE_LOCAL:
+                slots[code[ip + 2]] = pop()
+                ip += 3
+            elif op == LOAD_GLOBAL:
+                val = variables.get(constants[code[ip + 1]])
+                if val is None:
+                    val = self.global_scope.bind_lazy(constants[code[ip + 1]])
+                    if val is None:
+                        raise NameError(repr(constants[code[ip + 1]]))
+                push(val)
+                ip += 2
+            elif op == JUMP:
+                target = code[ip + 1]
+                if target < ip:
+                    steps -= 1
+                    if not steps:
+                        self.suspended = (code, constants, target, frame, frames, stack)
+                        return SUSPENDED
+                ip = target
+            elif op == LESS:
+                right = pop()
+                stack[-1] = stack[-1] < right
+                ip += 1
+            elif op == CALL:
+                argc = code[ip + 1]
+                ip += 2
+                function = stack[-argc - 1]
+                if type(function) == NativeFunction:
+                    result = function.function(*stack[len(stack) - argc:])
+                    del stack[-argc - 1:]
+                    push(result)
+                    continue
+
+                # Put argument values into a frame from the pool, or a new one if the
+                # function declares functions that could keep its frame alive.
+                if function.encloses_functions:
+                    pool = None
+                    new_frame = Frame(function.frame_size, function.frame)
+                else:
+                    pool = frame_pools.get(function.frame_size)
+                    if pool is None:
+                        pool = frame_pools[function.frame_size] = FramePool(function.frame_size)
+                    if pool.frames:
+                        new_frame = pool.frames.pop()
+                        new_frame.parent = function.frame
+                    else:
+                        new_frame = Frame(function.frame_size, function.frame)
+                if argc:
+                    new_frame.slots[:argc] = stack[-argc:]
+                del stack[-argc - 1:]
+
+                # The pool the new frame goes back to when the call returns.
+                frames.append((code, constants, ip, frame, pool))
+                code = function.chunk.code
+                constants = function.chunk.constants
+                ip = 0
+                frame = new_frame
+                slots = frame.slots
+                steps -= 1
+                if not steps:
+                    self.suspended = (code, constants, 0, frame, frames, stack)
+                    return SUSPENDED
+            elif op == RETURN:
+                returned = frame
+                code, constants, ip, frame, pool = frames.pop()
+                if pool is not None:
+                    returned.slots[:] = pool.blank
+                    returned.parent = None
+                    pool.frames.append(returned)
+                slots = frame.slots
+            elif op == LOAD_OUTER:
+                outer = frame
+                for _ in range(code[ip + 2]):
+                    outer = outer.parent
+                val = outer.slots[code[ip + 3]]
+                if val is None:
+                    raise NameError(repr(constants[code[ip + 1]]))
+                push(val)
+                ip += 4
+            elif op == STORE_GLOBAL:
+                name = constants[code[ip + 1]]
+                if variables.get(name) is None and self.global_scope.bind_lazy(name) is None:
+                    raise NameError(name)
+                variables[name] = pop()
+                ip += 2
+            elif op == SUBTRACT:
+                right = pop()
+                stack[-1] = stack[-1] - right
+                ip += 1
+            elif op == MODULO:
+                right = pop()
+                stack[-1] = stack[-1] % right
+                ip += 1
+            elif op == EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] == right
+                ip += 1
+            elif op == INDEX:
+                i = pop()
+                if type(i) == float:
+                    i = int(i)
+                stack[-1] = stack[-1][i]
+                ip += 1
+            elif op == MULTIPLY:
+                right = pop()
+                stack[-1] = stack[-1] * right
+                ip += 1
+            elif op == LEN:
+                stack[-1] = len(stack[-1])
+                ip += 1
+            elif op == LESS_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] <= right
+                ip += 1
+            elif op == STORE_OUTER:
+                outer = frame
+                for _ in range(code[ip + 2]):
+                    outer = outer.parent
+                outer.slots[code[ip + 3]] = pop()
+                ip += 4
+            elif op == GREATER:
+                right = pop()
+                stack[-1] = stack[-1] > right
+                ip += 1
+            elif op == GREATER_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] >= right
+                ip += 1
+            elif op == NOT_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] != right
+                ip += 1
+            elif op == DIVIDE:
+                right = pop()
+                stack[-1] = stack[-1] / right
+                ip += 1
+            elif op == CHECKED_ADD:
+                right = pop()
+                value = stack[-1] = stack[-1] + right
+                if type(value) in (list, str, Vector):
+                    self.check_size(value, code, ip)
+                ip += 1
+            elif op == CHECKED_MULTIPLY:
+                right = pop()
+                value = stack[-1] = stack[-1] * right
+                if type(value) in (list, str, Vector):
+                    self.check_size(value, code, ip)
+                ip += 1
+            elif op == SET_INDEX:
+                value = pop()
+                i = pop()
+                if type(i) == float:
+                    i = int(i)
+                pop()[i] = value
+                ip += 1
+            elif op == TAIL_CALL:
+                argc = code[ip + 1]
+                ip += 2
+                function = stack[-argc - 1]
+                if type(function) == NativeFunction:
+                    result = function.function(*stack[len(stack) - argc:])
+                    del stack[-argc - 1:]
+                    push(result)
+                    continue
+
+                # The called function replaces the current one, so when it returns
+                # it goes straight back to the current function's caller.
+                caller = frames[-1]
+                if caller[4] is not None:
+                    frame.slots[:] = caller[4].blank
+                    frame.parent = None
+                    caller[4].frames.append(frame)
+                if function.encloses_functions:
+                    pool = None
+                    new_frame = Frame(function.frame_size, function.frame)
+                else:
+                    pool = frame_pools.get(function.frame_size)
+                    if pool is None:
+                        pool = frame_pools[function.frame_size] = FramePool(function.frame_size)
+                    if pool.frames:
+                        new_frame = pool.frames.pop()
+                        new_frame.parent = function.frame
+                    else:
+                        new_frame = Frame(function.frame_size, function.frame)
+                if argc:
+                    new_frame.slots[:argc] = stack[-argc:]
+                del stack[-argc - 1:]
+                frames[-1] = caller[:4] + (pool,)
+
+                code = function.chunk.code
+                constants = function.chunk.constants
+                ip = 0
+                frame = new_frame
+                slots = frame.slots
+                steps -= 1
+                if not steps:
+                    self.suspended = (code, constants, 0, frame, frames, stack)
+                    return SUSPENDED
+            elif op == FUNC:
+                push(constants[code[ip + 1]].bind(frame))
+                ip += 2
+            elif op == DEFINE_GLOBAL:
+                variables[constants[code[ip + 1]]] = pop()
+                ip += 2
+            elif op == POP:
+                pop()
+                ip += 1
+            elif op == DUP:
+                push(stack[-1])
+                ip += 1
+            elif op == DUP_TWO:
+                stack.extend(stack[-2:])
+                ip += 1
+            elif op == JUMP_IF_TRUE:
+                if pop():
+                    ip = code[ip + 1]
+                else:
+                    ip += 2
+            elif op == JUMP_IF_FALSE_OR_POP:
+                if stack[-1]:
+                    pop()
+                    ip += 2
+                else:
+                    ip = code[ip + 1]
+            elif op == JUMP_IF_TRUE_OR_POP:
+                if stack[-1]:
+                    ip = code[ip + 1]
+                else:
+                    pop()
+                    ip += 2
+            elif op == NEGATE:
+                stack[-1] = -stack[-1]
+                ip += 1
+            elif op == POSITIVE:
+                stack[-1] = +stack[-1]
+                ip += 1
+            elif op == ARRAY:
+                count = code[ip + 1]
+                ip += 2
+                if count:
+                    array = stack[-count:]
+                    del stack[-count:]
+                else:
+                    array = []
+                push(array)
+            elif op == PRINT:
+                template = constants[code[ip + 1]]
+                ip += 2
+                argc = template.argc
+                args = stack[-argc:]
+                del stack[-argc:]
+                self.output.write(template.render(args))
+            elif op == CODE:
+                push(self.code_runner.run(constants[code[ip + 1]]))
+                ip += 2
+            elif op == MEMO_FUNC:
+                function = constants[code[ip + 1]].bind(frame)
+                push(memo.memoize(function.name, function.params,
+                                  lambda args, function=function: self.call_function(function, args), function))
+                ip += 2
+            elif op == HALT:
+                # Only calls made by call_function leave a value behind.
+                return stack[-1] if stack else None
+            else:
+                raise Exception('Unknown opcode {}'.format(op))